@@ -1,3 +1,4 @@
+import json
 from datetime import datetime
 
 from coordinator import run_deep_research
@@ -24,17 +25,45 @@ def _build_slug(query: str, max_length: int = 40) -> str:
 def start_research_process():
     load_dotenv()
     user_query = input("Enter your research query: ")
-    result = run_deep_research(user_query)
 
     slug = _build_slug(user_query, max_length=40)
     timestamp = datetime.now().strftime("%Y-%m-%d-%H-%M")
     filename = f"{slug}-{timestamp}.md"
     path = f"results/{filename}"
 
+    # The report is streamed: print it live and append it to the file as it arrives
+    stream_file = None
+
+    def on_report_chunk(text: str):
+        nonlocal stream_file
+        if stream_file is None:
+            stream_file = open(path, "w")
+        stream_file.write(text)
+        stream_file.flush()
+        print(text, end="", flush=True)
+
+    # Tokens, latency and cost of the run's LLM calls, next to the report
+    usage_path = f"results/{slug}-{timestamp}.usage.json"
+
+    def on_usage_summary(summary: dict):
+        with open(usage_path, "w") as f:
+            json.dump(summary, f, indent=2)
+
+    try:
+        result = run_deep_research(
+            user_query, on_report_chunk=on_report_chunk, on_usage_summary=on_usage_summary
+        )
+    finally:
+        if stream_file is not None:
+            stream_file.close()
+            print()
+
+    # Final write, so the file is complete even if streaming fell back midway
     with open(path, "w") as f:
         f.write(result)
 
     print(f"Research result saved to {path}")
+    print(f"LLM usage summary saved to {usage_path}")
 
 
 if __name__ == "__main__":
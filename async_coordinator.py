@@ -0,0 +1,447 @@
+import asyncio
+import json
+import logging
+import os
+from typing import Callable, Optional
+
+from slugify import slugify
+from smolagents.models import get_tool_json_schema
+
+from browser_pool import aclose_async_browser_pool
+from coordinator import (
+    ABANDONED_REPORT,
+    LLM_COORDINATOR_MODEL,
+    LLM_COORDINATOR_BASE_URL,
+    LLM_COORDINATOR_API_KEY,
+    LLM_SUBAGENT_MODEL,
+    LLM_SUBAGENT_BASE_URL,
+    LLM_SUBAGENT_API_KEY,
+    FETCH_DEADLINE,
+    SPLITTER_STREAMING,
+    SYNTHESIS_STREAMING,
+    RunState,
+    SubtaskBudget,
+    SubtaskResult,
+    current_run,
+    current_subtask,
+    fetch_page,
+    search_and_fetch,
+    _fill_result,
+    _fill_timed_out,
+    _print_failures,
+    _print_governor_stats,
+    _print_io_stats,
+    _report_usage,
+    _replace_duplicate,
+    _result_stubs,
+    _synthesis_messages,
+)
+from http_session import aclose_async_clients
+from llm import acompletion, cache_stats as llm_cache_stats
+from planner import agenerate_research_plan
+from prompts import SUBAGENT_SHARED_CONTEXT_TEMPLATE, SUBAGENT_TASK_TEMPLATE, SUBAGENT_WRAP_UP_PROMPT
+from scraper import afetch_url, is_likely_download_url
+from search import asearch_with_fallback
+from task_splitter import asplit_into_subtasks, astream_subtasks
+from usage import current_ledger, current_usage_subtask
+
+logger = logging.getLogger(__name__)
+
+# ******************************
+# Async engine configuration
+# ******************************
+# Page fetches in flight across all subagents of the event loop
+ASYNC_FETCH_CONCURRENCY = int(os.environ.get("ASYNC_FETCH_CONCURRENCY", 20))
+
+# Tool schemas from the smolagents tools of the sync engine
+SUBAGENT_TOOLS = [get_tool_json_schema(search_and_fetch), get_tool_json_schema(fetch_page)]
+
+# Semaphores and run counts per event loop
+_fetch_slots: dict[int, asyncio.Semaphore] = {}
+_active_runs: dict[int, int] = {}
+# Page fetches started by each run (key: id of its RunState) that haven't finished yet
+_run_fetches: dict[int, set[asyncio.Task]] = {}
+
+
+async def arun_deep_research(
+    user_query: str,
+    parallel: bool = True,
+    max_workers: int = 10,
+    on_report_chunk: Optional[Callable[[str], None]] = None,
+    on_usage_summary: Optional[Callable[[dict], None]] = None
+) -> str:
+    """
+    Async counterpart of run_deep_research, same arguments and result.
+
+    Runs entirely on the event loop: litellm's async completion, httpx for
+    search and static pages, Playwright's async API for rendering. At most
+    `max_workers` subagents (1 if not `parallel`) and ASYNC_FETCH_CONCURRENCY
+    page fetches run at once. Several runs can share one event loop; the
+    loop's HTTP clients and browser are closed when the last one finishes.
+    Page fetches still running when a run ends are cancelled first.
+    """
+    loop_id = id(asyncio.get_running_loop())
+    _active_runs[loop_id] = _active_runs.get(loop_id, 0) + 1
+
+    run = RunState()
+    _run_fetches[id(run)] = set()
+    run_token = current_run.set(run)
+    ledger_token = current_ledger.set(run.usage)
+    try:
+        final_report = await _arun_pipeline(
+            user_query, max_workers if parallel else 1, run, on_report_chunk
+        )
+    finally:
+        current_ledger.reset(ledger_token)
+        current_run.reset(run_token)
+        await _cancel_run_fetches(run)
+        _active_runs[loop_id] -= 1
+        if not _active_runs[loop_id]:
+            del _active_runs[loop_id]
+            _fetch_slots.pop(loop_id, None)
+            await aclose_async_clients()
+            await aclose_async_browser_pool()
+
+    _report_usage(run, on_usage_summary)
+    return final_report
+
+
+async def _cancel_run_fetches(run: RunState):
+    """Cancel the page fetches the run left running and wait until they are gone."""
+    tasks = _run_fetches.pop(id(run), set())
+    for task in tasks:
+        task.cancel()
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _arun_pipeline(
+    user_query: str,
+    max_workers: int,
+    run: RunState,
+    on_report_chunk: Optional[Callable[[str], None]]
+) -> str:
+    print("\033[93m[Phase 1] Generating Research Plan\033[0m")
+    research_plan = await agenerate_research_plan(user_query)
+
+    print()
+    if SPLITTER_STREAMING:
+        print("\033[93m[Phase 2+3] Generating and Executing Subtasks (streaming, async)\033[0m")
+        subtasks = astream_subtasks(research_plan)
+    else:
+        print("\033[93m[Phase 2] Generating Subtasks\033[0m")
+        subtasks = await asplit_into_subtasks(research_plan)
+        print(f"  → {len(subtasks)} subtasks identified")
+        print()
+        print("\033[93m[Phase 3] Executing Subtasks (async)\033[0m")
+
+    results = await _arun_subtasks(subtasks, user_query, research_plan, max_workers)
+
+    _print_io_stats(run)
+    _print_failures(results)
+
+    print()
+    print("\033[93m[Phase 4] Synthesizing Final Report\033[0m")
+    final_report = await _asynthesize_report(user_query, research_plan, results, on_chunk=on_report_chunk)
+
+    for stage, stats in llm_cache_stats().items():
+        print(f"  → LLM cache ({stage}): {stats['hits']} hits, {stats['misses']} misses")
+    _print_governor_stats()
+
+    return final_report
+
+
+async def _arun_subtasks(subtasks, user_query: str, research_plan: str, max_workers: int) -> list[SubtaskResult]:
+    """Start every subtask as it arrives (list or async stream), results in subtask order."""
+    slots = asyncio.Semaphore(max_workers)
+
+    async def run_one(subtask: dict) -> SubtaskResult:
+        async with slots:
+            try:
+                return await arun_subagent(subtask, user_query, research_plan)
+            except Exception as e:
+                logger.error(f"Subtask {subtask['id']} raised exception: {e}")
+                return SubtaskResult(
+                    subtask["id"], subtask["title"], f"[Fatal error: {e}]", success=False, error=str(e)
+                )
+
+    tasks = {}
+    if isinstance(subtasks, list):
+        tasks = {asyncio.ensure_future(run_one(subtask)): subtask for subtask in subtasks}
+    else:
+        async for subtask in subtasks:
+            print(f"  → Subtask {subtask['id']} queued: {subtask['title']}")
+            tasks[asyncio.ensure_future(run_one(subtask))] = subtask
+        print(f"  → {len(tasks)} subtasks identified")
+
+    if not tasks:
+        return []
+
+    run = current_run.get()
+    _, pending = await asyncio.wait(tasks, timeout=run.remaining() if run is not None else None)
+    if pending:
+        # Synthesis starts now, subagents that missed the run deadline are cancelled
+        run.stopped = True
+        print(f"\033[91m  ⚠ Run deadline reached, {len(pending)} subtask(s) unfinished\033[0m")
+        for task in pending:
+            task.cancel()
+        # Let them unwind before synthesis (and the shared clients closing)
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    return [
+        task.result() if task not in pending else SubtaskResult(
+            subtask["id"], subtask["title"], ABANDONED_REPORT,
+            success=False, error="Run deadline reached"
+        )
+        for task, subtask in tasks.items()
+    ]
+
+
+# ============================================================
+# SUBAGENT (tool-calling loop on litellm's async completion)
+# ============================================================
+
+async def arun_subagent(
+    subtask: dict,
+    user_query: str,
+    research_plan: str,
+    max_retries: int = 2
+) -> SubtaskResult:
+    """Async counterpart of run_subagent."""
+    subtask_id = slugify(subtask["id"]).replace("-", "_")
+    subtask_title = subtask["title"]
+    subtask_description = subtask["description"]
+
+    print(f"\033[94m[Subagent {subtask_id}] Starting: {subtask_title}\033[0m")
+
+    # Each task runs in its own copy of the context, no reset needed
+    current_subtask.set({"id": subtask_id, "title": subtask_title, "description": subtask_description})
+    current_usage_subtask.set(subtask_id)
+
+    messages = [
+        {"role": "system", "content": SUBAGENT_SHARED_CONTEXT_TEMPLATE.format(
+            user_query=user_query,
+            research_plan=research_plan,
+        )},
+        {"role": "user", "content": SUBAGENT_TASK_TEMPLATE.format(
+            subtask_id=subtask_id,
+            subtask_title=subtask_title,
+            subtask_description=subtask_description,
+        )},
+    ]
+
+    result = await _arun_subagent_attempts(subtask_id, subtask_title, messages, max_retries)
+
+    ledger = current_ledger.get()
+    if ledger is not None:
+        result.usage = ledger.totals(subtask=subtask_id)
+    return result
+
+
+async def _arun_subagent_attempts(
+    subtask_id: str,
+    subtask_title: str,
+    messages: list[dict],
+    max_retries: int
+) -> SubtaskResult:
+    # One budget for the subtask, across attempts
+    budget = SubtaskBudget(current_run.get())
+
+    for attempt in range(max_retries):
+        try:
+            report, partial_reason = await _agent_loop(list(messages), budget)
+            if partial_reason:
+                print(f"\033[93m[Subagent {subtask_id}] Completed (partial, {partial_reason} budget used up)\033[0m")
+            else:
+                print(f"\033[92m[Subagent {subtask_id}] Completed\033[0m")
+            return SubtaskResult(subtask_id, subtask_title, report, partial_reason=partial_reason)
+        except Exception as e:
+            logger.warning(f"Subagent {subtask_id} attempt {attempt + 1} failed: {e}")
+            # No new attempt once the run went on without this subagent
+            if attempt == max_retries - 1 or budget.abandoned:
+                return SubtaskResult(
+                    subtask_id, subtask_title,
+                    f"[Research incomplete due to error: {e}]",
+                    success=False,
+                    error=f"Subtask failed after {max_retries} attempts: {e}"
+                )
+
+    return SubtaskResult(subtask_id, subtask_title, "[No result]", success=False)
+
+
+async def _agent_loop(messages: list[dict], budget: SubtaskBudget) -> tuple[str, Optional[str]]:
+    """
+    Call tools until the model answers without tool calls; that answer is
+    the report. If a budget runs out first, the model writes the report from
+    the evidence so far. Returns the report and the budget that ran out.
+    """
+    model_kwargs = dict(
+        model=LLM_SUBAGENT_MODEL,
+        api_base=LLM_SUBAGENT_BASE_URL,
+        api_key=LLM_SUBAGENT_API_KEY,
+        drop_params=True,
+    )
+
+    while not (reason := budget.exhausted()):
+        response = await acompletion("subagent", messages=messages, tools=SUBAGENT_TOOLS, **model_kwargs)
+        message = response.choices[0].message
+        if not message.tool_calls:
+            return message.content or "", None
+
+        usage = getattr(response, "usage", None)
+        budget.record_step(
+            getattr(usage, "prompt_tokens", 0) or 0,
+            getattr(usage, "completion_tokens", 0) or 0,
+        )
+        messages.append(message.model_dump(exclude_none=True))
+        outputs = await asyncio.gather(*(_acall_tool(call) for call in message.tool_calls))
+        for call, output in zip(message.tool_calls, outputs):
+            messages.append({"role": "tool", "tool_call_id": call.id, "content": output})
+
+    if budget.abandoned:
+        return ABANDONED_REPORT, reason
+    messages.append({"role": "user", "content": SUBAGENT_WRAP_UP_PROMPT})
+    response = await acompletion("subagent", messages=messages, **model_kwargs)
+    return response.choices[0].message.content or "", reason
+
+
+async def _acall_tool(call) -> str:
+    try:
+        arguments = json.loads(call.function.arguments or "{}")
+        if call.function.name == "search_and_fetch":
+            return json.dumps(await asearch_and_fetch(**arguments), ensure_ascii=False)
+        if call.function.name == "fetch_page":
+            return await afetch_page(**arguments)
+        return f"Error: unknown tool '{call.function.name}'"
+    except Exception as e:
+        return f"Error: {e}"
+
+
+# ============================================================
+# TOOLS
+# ============================================================
+
+async def afetch_page(url: str) -> str:
+    """Async counterpart of the fetch_page tool."""
+    if is_likely_download_url(url):
+        return "Skipped: URL appears to be a file download"
+
+    content = await _afetch_for_run(url)
+
+    if content:
+        return _replace_duplicate(url, content) or content
+
+    return "Error: Could not fetch page content"
+
+
+async def asearch_and_fetch(query: str, num_results: int = 10) -> list[dict]:
+    """Async counterpart of the search_and_fetch tool."""
+    print(f"    🔍 Searching: {query}")
+
+    num_results = min(num_results or 10, 5)
+
+    search_results, source = await asearch_with_fallback(query, num_results)
+
+    if not search_results:
+        print(f"    ❌ No search results from any source")
+        return []
+
+    print(f"    ✓ Got {len(search_results)} results from {source}")
+
+    results = _result_stubs(search_results, source)
+    if not results:
+        return results
+
+    tasks = {}
+    for result in results:
+        print(f"    📄 Fetching: {result['url']}")
+        tasks[asyncio.ensure_future(_afetch_for_run(result["url"]))] = result
+
+    # Stragglers keep running and land in the evidence registry for later
+    # calls; the run cancels them when it ends. Outside a run nobody would
+    # use them.
+    run = current_run.get()
+    run_fetches = _run_fetches.get(id(run)) if run is not None else None
+    if run_fetches is not None:
+        for task in tasks:
+            run_fetches.add(task)
+            task.add_done_callback(run_fetches.discard)
+
+    done, pending = await asyncio.wait(tasks, timeout=FETCH_DEADLINE)
+    if run_fetches is None:
+        for task in pending:
+            task.cancel()
+
+    for task, result in tasks.items():
+        if task not in done:
+            _fill_timed_out(result)
+            continue
+        try:
+            _fill_result(result, task.result(), query)
+        except Exception as e:
+            result["full_content"] = result["snippet"] or f"Fetch error: {e}"
+            result["fetch_status"] = "error"
+
+    return results
+
+
+async def _afetch_for_run(url: str) -> Optional[str]:
+    loop_id = id(asyncio.get_running_loop())
+    if loop_id not in _fetch_slots:
+        _fetch_slots[loop_id] = asyncio.Semaphore(ASYNC_FETCH_CONCURRENCY)
+    slots = _fetch_slots[loop_id]
+
+    async def fetch(page_url: str) -> Optional[str]:
+        async with slots:
+            return await afetch_url(page_url)
+
+    run = current_run.get()
+    if run is None:
+        return await fetch(url)
+
+    subtask = current_subtask.get()
+    requester = subtask["id"] if subtask else ""
+    return await run.evidence.afetch(url, fetch, requester=requester)
+
+
+# ============================================================
+# SYNTHESIS
+# ============================================================
+
+async def _asynthesize_report(
+    user_query: str,
+    research_plan: str,
+    results: list[SubtaskResult],
+    on_chunk: Optional[Callable[[str], None]] = None
+) -> str:
+    """Async counterpart of _synthesize_report."""
+    # Condensing oversized input (rare) reuses the threaded map-reduce pass
+    messages = await asyncio.to_thread(_synthesis_messages, user_query, research_plan, results)
+    model_kwargs = dict(
+        model=LLM_COORDINATOR_MODEL,
+        api_base=LLM_COORDINATOR_BASE_URL,
+        api_key=LLM_COORDINATOR_API_KEY,
+        drop_params=True,
+        messages=messages,
+    )
+
+    if on_chunk is not None and SYNTHESIS_STREAMING:
+        try:
+            parts = []
+            stream = await acompletion(
+                "synthesis", stream=True, stream_options={"include_usage": True}, **model_kwargs
+            )
+            async for chunk in stream:
+                text = chunk.choices[0].delta.content if chunk.choices else None
+                if text:
+                    on_chunk(text)
+                    parts.append(text)
+            if parts:
+                return "".join(parts)
+            logger.warning("Streaming synthesis returned no content, retrying without streaming")
+        except Exception as e:
+            logger.warning(f"Streaming synthesis failed, retrying without streaming: {e}")
+
+    response = await acompletion("synthesis", **model_kwargs)
+    return response.choices[0].message.content or ""
+
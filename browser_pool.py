@@ -0,0 +1,347 @@
+import asyncio
+import atexit
+import logging
+import os
+import queue
+import threading
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Awaitable, Callable, Optional
+
+from playwright.async_api import async_playwright
+from playwright.async_api import Page as AsyncPage
+from playwright.sync_api import sync_playwright, Page
+
+logger = logging.getLogger(__name__)
+
+# ******************************
+# Pool configuration
+# ******************************
+BROWSER_POOL_SIZE = int(os.environ.get("BROWSER_POOL_SIZE", 3))
+BROWSER_MAX_PAGES = int(os.environ.get("BROWSER_MAX_PAGES", 50))
+BROWSER_CHECKOUT_TIMEOUT = float(os.environ.get("BROWSER_CHECKOUT_TIMEOUT", 30))  # seconds
+
+LAUNCH_ARGS = [
+    '--disable-gpu',
+    '--disable-dev-shm-usage',
+    '--no-sandbox',
+    '--disable-setuid-sandbox',
+    '--disable-extensions',
+]
+
+# Heavy resources we never need for text extraction
+BLOCKED_RESOURCES = "**/*.{png,jpg,jpeg,gif,svg,ico,woff,woff2,ttf}"
+
+
+class _BrowserWorker:
+    """
+    One warm Chromium process with a reusable context and page.
+
+    Playwright's sync API is bound to the thread that started it, so the
+    browser, its context and its page live on a dedicated worker thread.
+    Other threads hand over jobs through a queue and wait on a Future.
+    """
+    def __init__(self, worker_id: int, max_pages: int):
+        self.worker_id = worker_id
+        self.max_pages = max_pages
+        self.alive = True
+
+        self._jobs: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+        # Only touched from the worker thread
+        self._browser = None
+        self._context = None
+        self._page: Optional[Page] = None
+        self._pages_served = 0
+
+    def submit(self, job: Callable[[Page], Optional[str]]) -> Future:
+        """Queue a job that receives a ready-to-use page."""
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._loop,
+                    name=f"browser-pool-{self.worker_id}",
+                    daemon=True,
+                )
+                self._thread.start()
+
+        future: Future = Future()
+        self._jobs.put((job, future))
+        return future
+
+    def close(self, timeout: float = 5):
+        if self._thread is None:
+            return
+        self._jobs.put(None)
+        self._thread.join(timeout=timeout)
+
+    # ------------------------------
+    # Worker thread
+    # ------------------------------
+    def _loop(self):
+        try:
+            with sync_playwright() as p:
+                while True:
+                    item = self._jobs.get()
+                    if item is None:
+                        break
+                    self._run_job(p, *item)
+                self._close_browser()
+        except Exception as e:
+            logger.warning(f"Browser worker {self.worker_id} died: {e}")
+        finally:
+            self.alive = False
+            self._fail_pending()
+
+    def _run_job(self, p, job: Callable[[Page], Optional[str]], future: Future):
+        if not future.set_running_or_notify_cancel():
+            return
+
+        try:
+            page = self._checkout_page(p)
+            future.set_result(job(page))
+        except BaseException as e:
+            # Page state is unknown after a failure, start fresh next time
+            self._close_page()
+            future.set_exception(e)
+        finally:
+            self._pages_served += 1
+
+    def _checkout_page(self, p) -> Page:
+        # Recycle after N pages to keep Chromium's memory in check
+        if self._pages_served >= self.max_pages:
+            logger.info(f"Browser worker {self.worker_id}: recycling after {self._pages_served} pages")
+            self._close_browser()
+
+        # Health check: relaunch if the browser process went away
+        if self._browser is None or not self._browser.is_connected():
+            self._close_browser()
+            self._browser = p.chromium.launch(headless=True, args=LAUNCH_ARGS)
+            self._context = self._browser.new_context(
+                java_script_enabled=True,
+                ignore_https_errors=True,
+            )
+            # Block heavy resources to speed up loading
+            self._context.route(BLOCKED_RESOURCES, lambda route: route.abort())
+            self._pages_served = 0
+
+        if self._page is None or self._page.is_closed():
+            self._page = self._context.new_page()
+            # Block downloads
+            self._page.on("download", lambda download: download.cancel())
+
+        return self._page
+
+    def _close_page(self):
+        if self._page is not None:
+            try:
+                self._page.close()
+            except Exception:
+                pass
+        self._page = None
+
+    def _close_browser(self):
+        self._close_page()
+        for resource in (self._context, self._browser):
+            if resource is not None:
+                try:
+                    resource.close()
+                except Exception:
+                    pass
+        self._context = None
+        self._browser = None
+
+    def _fail_pending(self):
+        while True:
+            try:
+                item = self._jobs.get_nowait()
+            except queue.Empty:
+                return
+            if item is None:
+                continue
+            _, future = item
+            if future.set_running_or_notify_cancel():
+                future.set_exception(RuntimeError(f"Browser worker {self.worker_id} is not running"))
+
+
+class BrowserPool:
+    """
+    A small pool of long-lived browsers shared by all scraper threads.
+
+    A fetch checks out an idle worker, runs on that worker's page and returns
+    the worker once the job is done (also after the caller timed out).
+    Dead workers are replaced on return.
+    """
+    def __init__(self, size: int = BROWSER_POOL_SIZE, max_pages: int = BROWSER_MAX_PAGES):
+        self.size = size
+        self.max_pages = max_pages
+        self._idle: queue.Queue = queue.Queue()
+        self._workers: list[_BrowserWorker] = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+        for i in range(size):
+            self._add_worker(i)
+
+    def _add_worker(self, worker_id: int) -> _BrowserWorker:
+        worker = _BrowserWorker(worker_id, self.max_pages)
+        with self._lock:
+            self._workers.append(worker)
+        self._idle.put(worker)
+        return worker
+
+    def run(self, job: Callable[[Page], Optional[str]], timeout: float) -> Optional[str]:
+        """
+        Run `job(page)` on a pooled page.
+
+        Returns None if no browser becomes free within BROWSER_CHECKOUT_TIMEOUT.
+        Exceptions raised by the job are re-raised in the calling thread.
+        """
+        if self._closed:
+            return None
+
+        try:
+            worker = self._idle.get(timeout=BROWSER_CHECKOUT_TIMEOUT)
+        except queue.Empty:
+            logger.warning("No browser available from pool")
+            return None
+
+        # The worker goes back to the pool once its job has finished, not when
+        # the caller gives up waiting: a timed-out render still occupies it
+        future = worker.submit(job)
+        future.add_done_callback(lambda _: self._return(worker))
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            return None
+
+    def _return(self, worker: _BrowserWorker):
+        if worker.alive or self._closed:
+            self._idle.put(worker)
+            return
+        with self._lock:
+            if worker in self._workers:
+                self._workers.remove(worker)
+        self._add_worker(worker.worker_id)
+
+    def close(self):
+        self._closed = True
+        with self._lock:
+            workers = list(self._workers)
+        for worker in workers:
+            worker.close()
+
+
+_pool: Optional[BrowserPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_browser_pool() -> BrowserPool:
+    """Process-wide pool, created on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool()
+            atexit.register(_pool.close)
+        return _pool
+
+
+class AsyncBrowserPool:
+    """
+    asyncio counterpart of BrowserPool for the async engine.
+
+    One Chromium driven from the event loop; up to `size` pages render at
+    once, each in a fresh page of a shared context. The browser is relaunched
+    when it died, and recycled after `max_pages` once no page is open on it.
+    """
+    def __init__(self, size: int = BROWSER_POOL_SIZE, max_pages: int = BROWSER_MAX_PAGES):
+        self.max_pages = max_pages
+        self._slots = asyncio.Semaphore(size)
+        self._lock = asyncio.Lock()
+        self._playwright = None
+        self._browser = None
+        self._context = None
+        self._pages_served = 0
+        self._open_pages = 0
+
+    async def run(self, job: Callable[[AsyncPage], Awaitable[Optional[str]]], timeout: float) -> Optional[str]:
+        """Await `job(page)` on a fresh page; None if no slot frees up or the job times out."""
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=BROWSER_CHECKOUT_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning("No browser available from pool")
+            return None
+
+        page = None
+        try:
+            page = await self._new_page()
+            return await asyncio.wait_for(job(page), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            if page is not None:
+                self._open_pages -= 1
+                try:
+                    await page.close()
+                except Exception:
+                    pass
+            self._slots.release()
+
+    async def _new_page(self) -> AsyncPage:
+        async with self._lock:
+            recycle = self._pages_served >= self.max_pages and self._open_pages == 0
+            if recycle or self._browser is None or not self._browser.is_connected():
+                await self._close_browser()
+                if self._playwright is None:
+                    self._playwright = await async_playwright().start()
+                self._browser = await self._playwright.chromium.launch(headless=True, args=LAUNCH_ARGS)
+                self._context = await self._browser.new_context(
+                    java_script_enabled=True,
+                    ignore_https_errors=True,
+                )
+                # Block heavy resources to speed up loading
+                await self._context.route(BLOCKED_RESOURCES, lambda route: route.abort())
+                self._pages_served = 0
+
+            page = await self._context.new_page()
+            # Block downloads
+            page.on("download", lambda download: download.cancel())
+            self._pages_served += 1
+            self._open_pages += 1
+            return page
+
+    async def _close_browser(self):
+        for resource in (self._context, self._browser):
+            if resource is not None:
+                try:
+                    await resource.close()
+                except Exception:
+                    pass
+        self._context = None
+        self._browser = None
+
+    async def close(self):
+        await self._close_browser()
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+
+# Async pools are bound to their event loop
+_async_pools: dict[int, AsyncBrowserPool] = {}
+
+
+def get_async_browser_pool() -> AsyncBrowserPool:
+    """Pool of the running event loop, created on first use."""
+    loop_id = id(asyncio.get_running_loop())
+    if loop_id not in _async_pools:
+        _async_pools[loop_id] = AsyncBrowserPool()
+    return _async_pools[loop_id]
+
+
+async def aclose_async_browser_pool():
+    pool = _async_pools.pop(id(asyncio.get_running_loop()), None)
+    if pool is not None:
+        await pool.close()
@@ -1,20 +1,44 @@
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
 from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
 import json
 import logging
 import os
 import sys
-from typing import Optional
+import threading
+import time
+from typing import Callable, Iterable, Iterator, Optional
 
-from prompts import SUBAGENT_PROMPT_TEMPLATE, COORDINATOR_SYNTHESIS_PROMPT_TEMPLATE
+from dedup import NearDuplicateIndex, duplicate_reference
+from evidence import EvidenceRegistry
+from llm import StageClient, cache_stats as llm_cache_stats, connection_stats, governor_stats
+from prompts import (
+    SUBAGENT_SHARED_CONTEXT_TEMPLATE,
+    SUBAGENT_TASK_TEMPLATE,
+    SUBAGENT_WRAP_UP_PROMPT,
+    COORDINATOR_SYNTHESIS_SYSTEM_PROMPT,
+    COORDINATOR_SYNTHESIS_PROMPT_TEMPLATE,
+    SYNTHESIS_CONDENSE_PROMPT_TEMPLATE,
+)
 from planner import generate_research_plan
-from scraper import fetch_url, is_likely_download_url
-from search import search_with_fallback
-from task_splitter import split_into_subtasks
+from relevance import select_relevant_content
+from usage import UsageLedger, current_ledger, current_usage_subtask
+from scraper import fetch_url, is_likely_download_url, fetch_flight, async_fetch_flight, fetch_cache
+from search import (
+    search_with_fallback,
+    search_flight,
+    async_search_flight,
+    search_cache,
+    search_schedulers,
+    backend_latency_stats,
+)
+from task_splitter import split_into_subtasks, stream_subtasks
 
 import litellm
 from slugify import slugify
 from smolagents import LiteLLMModel, ToolCallingAgent, tool
+from smolagents.memory import ActionStep, FinalAnswerStep
+from smolagents.models import ChatMessage, MessageRole
 from smolagents.monitoring import LogLevel
 
 litellm.drop_params = True
@@ -61,17 +85,157 @@ LLM_SUBAGENT_CONFIG = {
 }
 
 
+MODEL_CONFIGS = {"coordinator": LLM_COORDINATOR_CONFIG, "subagent": LLM_SUBAGENT_CONFIG}
+# Pipeline stage of each config (for the LLM response cache)
+MODEL_STAGES = {"coordinator": "synthesis", "subagent": "subagent"}
+
+# One model object per config, shared by all subagents and phases.
+# LiteLLMModel keeps no per-call state, so sharing it across threads is safe.
+_models: dict[str, LiteLLMModel] = {}
+_model_stats = {"created": 0, "reused": 0}
+_models_lock = threading.Lock()
+
+
 def get_model(use_config: str = "coordinator") -> LiteLLMModel:
     """
     Factory function for consistent model creation.
     Pass which config to use by passing "coordinator" or "subagent"
+
+    The model of a config is created on first use and reused afterwards.
     """
-    model_configs = {"coordinator": LLM_COORDINATOR_CONFIG, "subagent": LLM_SUBAGENT_CONFIG}
-    try:
-        use_config = model_configs[use_config]
-        return LiteLLMModel(**use_config)
-    except:
-        return LiteLLMModel(**model_configs.get("coordinator"))
+    if use_config not in MODEL_CONFIGS:
+        raise ValueError(f"Unknown model config '{use_config}', expected one of {list(MODEL_CONFIGS)}")
+
+    with _models_lock:
+        model = _models.get(use_config)
+        if model is not None:
+            _model_stats["reused"] += 1
+            return model
+
+        # retry=False: the LLM governor (llm.py) already retries rate limits
+        # per completion; smolagents' own retryer would multiply the attempts
+        model = LiteLLMModel(
+            **MODEL_CONFIGS[use_config],
+            client=StageClient(MODEL_STAGES[use_config]),
+            retry=False,
+        )
+        _models[use_config] = model
+        _model_stats["created"] += 1
+        return model
+
+
+def model_registry_stats() -> dict:
+    with _models_lock:
+        return dict(_model_stats)
+
+
+# ******************************
+# Page fetching inside search_and_fetch
+# ******************************
+FETCH_MAX_WORKERS = int(os.environ.get("FETCH_MAX_WORKERS", 5))
+FETCH_DEADLINE = float(os.environ.get("FETCH_DEADLINE", 20))  # seconds per search_and_fetch call
+
+# Max chars of page content per search result, filled with the chunks most
+# relevant to the search query and the subtask
+CONTENT_BUDGET_CHARS = int(os.environ.get("CONTENT_BUDGET_CHARS", 6000))
+
+# Near-duplicate pages (mirrors, syndicated copies) are replaced by a short
+# reference to the first URL seen in the run
+DEDUP_SIMILARITY = float(os.environ.get("DEDUP_SIMILARITY", 0.85))
+
+
+# ******************************
+# Subagent budgets and run deadline
+# ******************************
+# A subagent that runs out of a budget writes its report from the evidence
+# gathered so far; the result is marked partial. 0 = no time/token limit.
+SUBAGENT_TIME_BUDGET = float(os.environ.get("SUBAGENT_TIME_BUDGET", 600))  # seconds per subtask
+SUBAGENT_MAX_STEPS = int(os.environ.get("SUBAGENT_MAX_STEPS", 20))  # tool-calling steps per subtask
+SUBAGENT_TOKEN_BUDGET = int(os.environ.get("SUBAGENT_TOKEN_BUDGET", 0))  # input + output tokens per subtask
+
+# Synthesis starts this long after the run started, with the subtasks done by then (0 = wait for all)
+RUN_DEADLINE = float(os.environ.get("RUN_DEADLINE", 0))  # seconds
+# Subagents start writing their reports this long before the run deadline
+RUN_WRAP_UP_TIME = float(os.environ.get("RUN_WRAP_UP_TIME", 60))  # seconds
+
+ABANDONED_REPORT = "[Not finished before the run deadline]"
+
+
+class RunState:
+    """State shared by all subagents of one run_deep_research call."""
+    def __init__(self):
+        # Fingerprints of all pages returned to subagents
+        self.duplicates = NearDuplicateIndex(threshold=DEDUP_SIMILARITY)
+        # Every page fetched in the run, served again to later tool calls
+        self.evidence = EvidenceRegistry()
+        # Tokens, latency and cost of every LLM call of the run
+        self.usage = UsageLedger()
+        # time.monotonic() by which synthesis starts (None = no deadline)
+        self.deadline = time.monotonic() + RUN_DEADLINE if RUN_DEADLINE else None
+        # Set once synthesis started without waiting for every subagent;
+        # subagents still running stop at their next step
+        self.stopped = False
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left until the run deadline (None = no deadline)."""
+        return None if self.deadline is None else max(0.0, self.deadline - time.monotonic())
+
+
+class SubtaskBudget:
+    """Wall-clock, step and token budget of one subagent."""
+    def __init__(self, run: Optional[RunState], max_steps: int = SUBAGENT_MAX_STEPS):
+        self.run = run
+        self.max_steps = max_steps
+        self.steps = 0
+        self.tokens = 0
+
+        deadlines = []
+        if SUBAGENT_TIME_BUDGET:
+            deadlines.append(time.monotonic() + SUBAGENT_TIME_BUDGET)
+        if run is not None and run.deadline is not None:
+            deadlines.append(run.deadline - RUN_WRAP_UP_TIME)
+        self.deadline = min(deadlines) if deadlines else None
+
+    def record_step(self, input_tokens: int = 0, output_tokens: int = 0):
+        self.steps += 1
+        self.tokens += input_tokens + output_tokens
+
+    def exhausted(self) -> Optional[str]:
+        """The budget that ran out ("time", "step" or "token"), None while there is budget left."""
+        if self.abandoned:
+            return "time"
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return "time"
+        if self.steps >= self.max_steps:
+            return "step"
+        if SUBAGENT_TOKEN_BUDGET and self.tokens >= SUBAGENT_TOKEN_BUDGET:
+            return "token"
+        return None
+
+    @property
+    def abandoned(self) -> bool:
+        """The run went on without this subagent; a report would not be used anymore."""
+        return self.run is not None and self.run.stopped
+
+
+# The tools pick up run and subtask through context variables.
+# smolagents copies the context into its parallel tool-call threads.
+current_run: ContextVar[Optional[RunState]] = ContextVar("current_run", default=None)
+current_subtask: ContextVar[Optional[dict]] = ContextVar("current_subtask", default=None)
+
+
+# Start subagents while the splitter is still streaming the subtask list
+SPLITTER_STREAMING = os.environ.get("SPLITTER_STREAMING", "1") == "1"
+
+# Stream the final report while it is generated (if a chunk handler is given)
+SYNTHESIS_STREAMING = os.environ.get("SYNTHESIS_STREAMING", "1") == "1"
+
+# Synthesis input budget (tokens). Larger inputs are condensed in parallel
+# batches first (map) and the condensed notes are synthesized (reduce).
+SYNTHESIS_MAX_INPUT_TOKENS = int(os.environ.get("SYNTHESIS_MAX_INPUT_TOKENS", 60000))
+SYNTHESIS_BATCH_TOKENS = int(os.environ.get("SYNTHESIS_BATCH_TOKENS", 20000))
+SYNTHESIS_MAP_WORKERS = int(os.environ.get("SYNTHESIS_MAP_WORKERS", 4))
+SYNTHESIS_MAX_LEVELS = 3
 
 
 # ******************************
@@ -162,10 +326,10 @@ def fetch_page(url: str) -> str:
     if is_likely_download_url(url):
         return "Skipped: URL appears to be a file download"
     
-    content = fetch_url(url=url)
+    content = _fetch_for_run(url)
     
     if content:
-        return content
+        return _replace_duplicate(url, content) or content
     
     return "Error: Could not fetch page content"
 
@@ -198,6 +362,36 @@ def search_and_fetch(query: str, num_results: int = 10) -> list[dict]:
     
     print(f"    ✓ Got {len(search_results)} results from {source}")
 
+    results = _result_stubs(search_results, source)
+
+    if not results:
+        return results
+
+    # Fetch all pages concurrently, keep whatever finished before the deadline
+    executor = ThreadPoolExecutor(max_workers=min(FETCH_MAX_WORKERS, len(results)))
+    future_to_result = {}
+    for result in results:
+        print(f"    📄 Fetching: {result['url']}")
+        future_to_result[executor.submit(copy_context().run, _fetch_for_run, result["url"])] = result
+
+    done, not_done = wait(future_to_result, timeout=FETCH_DEADLINE)
+    # Don't block on stragglers, they finish (or time out) in the background
+    executor.shutdown(wait=False, cancel_futures=True)
+
+    for future, result in future_to_result.items():
+        if future in not_done:
+            _fill_timed_out(result)
+            continue
+        try:
+            _fill_result(result, future.result(), query)
+        except Exception as e:
+            result["full_content"] = result["snippet"] or f"Fetch error: {e}"
+            result["fetch_status"] = "error"
+    
+    return results
+
+def _result_stubs(search_results: list[dict], source: str) -> list[dict]:
+    """One result dict per usable search hit, content not fetched yet."""
     results = []
     for item in search_results:
         url = item.get("url")
@@ -210,44 +404,101 @@ def search_and_fetch(query: str, num_results: int = 10) -> list[dict]:
             print(f"    ⏭️  Skipping download: {url}")
             continue
 
-        result = {
+        results.append({
             "title": item.get("title"),
             "url": url,
             "snippet": item.get("snippet"),
             "full_content": None,
             "fetch_status": "not_attempted",
             "search_source": source,
-        }
-        
-        print(f"    📄 Fetching: {url}")
-        try:
-            content = fetch_url(url)
-            if content:
-                result["full_content"] = content[:15000]
-                result["fetch_status"] = "success"
-            else:
-                result["full_content"] = item.get("snippet", "No content available")
-                result["fetch_status"] = "failed_using_snippet"
-        except Exception as e:
-            result["full_content"] = item.get("snippet", f"Fetch error: {e}")
-            result["fetch_status"] = "error"
-        
-        results.append(result)
-    
+        })
     return results
 
+
+def _fill_result(result: dict, content: Optional[str], query: str):
+    """Put the fetched page (relevant parts, or a duplicate reference) into a result."""
+    reference = _replace_duplicate(result["url"], content) if content else None
+    if reference:
+        result["full_content"] = reference
+        result["fetch_status"] = "duplicate"
+    elif content:
+        result["full_content"] = select_relevant_content(
+            content,
+            query=query,
+            context=_subtask_context(),
+            budget=CONTENT_BUDGET_CHARS,
+        )
+        result["fetch_status"] = "success"
+    else:
+        result["full_content"] = result["snippet"] or "No content available"
+        result["fetch_status"] = "failed_using_snippet"
+
+
+def _fill_timed_out(result: dict):
+    print(f"    ⏱️  Fetch deadline exceeded: {result['url']}")
+    result["full_content"] = result["snippet"] or "No content available"
+    result["fetch_status"] = "timeout_using_snippet"
+
+def _subtask_context() -> str:
+    subtask = current_subtask.get()
+    return f"{subtask['title']}\n{subtask['description']}" if subtask else ""
+
+
+def _fetch_for_run(url: str) -> Optional[str]:
+    """fetch_url, but pages already fetched in this run are served from the registry."""
+    run = current_run.get()
+    if run is None:
+        return fetch_url(url)
+
+    subtask = current_subtask.get()
+    requester = subtask["id"] if subtask else ""
+    return run.evidence.fetch(url, fetch_url, requester=requester)
+
+
+def _replace_duplicate(url: str, content: str) -> Optional[str]:
+    """Short reference if the run already returned a near-identical page, else None."""
+    run = current_run.get()
+    if run is None:
+        return None
+
+    index = run.duplicates
+    seen_url = index.check(url, content)
+    if seen_url is None:
+        return None
+
+    print(f"    ♻️  Near-duplicate of {seen_url}: {url}")
+    reference = duplicate_reference(seen_url)
+    index.record_saving(content, reference)
+    return reference
+
 # ============================================================
 # SUBAGENT RUNNER (explicit function, not a tool)
 # ============================================================
 
 class SubtaskResult:
     """Container for subtask execution results."""
-    def __init__(self, subtask_id: str, title: str, report: str, success: bool = True, error: Optional[str] = None):
+    def __init__(
+        self,
+        subtask_id: str,
+        title: str,
+        report: str,
+        success: bool = True,
+        error: Optional[str] = None,
+        partial_reason: Optional[str] = None
+    ):
         self.subtask_id = subtask_id
         self.title = title
         self.report = report
         self.success = success
         self.error = error
+        # Budget that ran out ("time", "step", "token") if the report was written early
+        self.partial_reason = partial_reason
+        # LLM usage totals of the subtask (calls, tokens, latency, cost)
+        self.usage: Optional[dict] = None
+
+    @property
+    def partial(self) -> bool:
+        return self.partial_reason is not None
 
 
 def run_subagent(
@@ -276,19 +527,55 @@ def run_subagent(
     
     print(f"\033[94m[Subagent {subtask_id}] Starting: {subtask_title}\033[0m")
     
+    # Lets search_and_fetch rank page content against this subtask
+    subtask_token = current_subtask.set(
+        {"id": subtask_id, "title": subtask_title, "description": subtask_description}
+    )
+    # LLM calls from here on are booked on this subtask
+    usage_token = current_usage_subtask.set(subtask_id)
+    try:
+        result = _run_subagent_attempts(
+            subtask_id, subtask_title, subtask_description, user_query, research_plan, max_retries
+        )
+    finally:
+        current_usage_subtask.reset(usage_token)
+        current_subtask.reset(subtask_token)
+
+    ledger = current_ledger.get()
+    if ledger is not None:
+        result.usage = ledger.totals(subtask=subtask_id)
+    return result
+
+
+def _run_subagent_attempts(
+    subtask_id: str,
+    subtask_title: str,
+    subtask_description: str,
+    user_query: str,
+    research_plan: str,
+    max_retries: int
+) -> SubtaskResult:
+    # The shared context goes into the system prompt, which is then
+    # identical for all subagents of the run (cacheable prefix).
+    # The agent is reused across attempts, run() starts with a fresh memory.
+    subagent = ToolCallingAgent(
+        tools=[search_and_fetch, fetch_page],
+        model=get_model(use_config="subagent"),
+        instructions=SUBAGENT_SHARED_CONTEXT_TEMPLATE.format(
+            user_query=user_query,
+            research_plan=research_plan,
+        ),
+        add_base_tools=False,
+        name=f"subagent_{subtask_id}",
+        verbosity_level=LogLevel.ERROR,
+    )
+
+    # One budget for the subtask, across attempts
+    budget = SubtaskBudget(current_run.get())
+
     for attempt in range(max_retries):
         try:
-            subagent = ToolCallingAgent(
-                tools=[search_and_fetch, fetch_page],
-                model=get_model(use_config="subagent"),
-                add_base_tools=False,
-                name=f"subagent_{subtask_id}",
-                verbosity_level=LogLevel.ERROR,
-            )
-            
-            prompt = SUBAGENT_PROMPT_TEMPLATE.format(
-                user_query=user_query,
-                research_plan=research_plan,
+            prompt = SUBAGENT_TASK_TEMPLATE.format(
                 subtask_id=subtask_id,
                 subtask_title=subtask_title,
                 subtask_description=subtask_description,
@@ -296,16 +583,18 @@ def run_subagent(
             
             # Filter out the noisy parsing messages
             with filtered_agent_output():
-                result = subagent.run(prompt)
+                report, partial_reason = _run_within_budget(subagent, prompt, budget)
 
-            report = str(result)
-            
-            print(f"\033[92m[Subagent {subtask_id}] Completed\033[0m")
-            return SubtaskResult(subtask_id, subtask_title, report)
+            if partial_reason:
+                print(f"\033[93m[Subagent {subtask_id}] Completed (partial, {partial_reason} budget used up)\033[0m")
+            else:
+                print(f"\033[92m[Subagent {subtask_id}] Completed\033[0m")
+            return SubtaskResult(subtask_id, subtask_title, report, partial_reason=partial_reason)
             
         except Exception as e:
             logger.warning(f"Subagent {subtask_id} attempt {attempt + 1} failed: {e}")
-            if attempt == max_retries - 1:
+            # No new attempt once the run went on without this subagent
+            if attempt == max_retries - 1 or budget.abandoned:
                 error_msg = f"Subtask failed after {max_retries} attempts: {e}"
                 return SubtaskResult(
                     subtask_id, subtask_title, 
@@ -317,11 +606,53 @@ def run_subagent(
     # Should not reach here, but just in case
     return SubtaskResult(subtask_id, subtask_title, "[No result]", success=False)
 
+
+def _run_within_budget(subagent: ToolCallingAgent, prompt: str, budget: SubtaskBudget) -> tuple[str, Optional[str]]:
+    """
+    Run the agent step by step. If a budget runs out before the final
+    answer, stop and have the model write the report from the agent's memory.
+
+    Returns the report and the budget that ran out (None if the agent finished).
+    """
+    # One step more than the budget, so smolagents' own step limit never kicks in first
+    steps = subagent.run(prompt, stream=True, max_steps=budget.max_steps + 1)
+    reason = None
+    try:
+        for step in steps:
+            if isinstance(step, FinalAnswerStep):
+                return str(step.output), None
+            if isinstance(step, ActionStep) and not step.is_final_answer:
+                usage = step.token_usage
+                budget.record_step(usage.input_tokens if usage else 0, usage.output_tokens if usage else 0)
+                reason = budget.exhausted()
+                if reason:
+                    break
+    finally:
+        steps.close()
+
+    if budget.abandoned:
+        # No wrap-up call (and cost) for a report nobody reads
+        return ABANDONED_REPORT, reason
+    return _wrap_up_report(subagent), reason or "step"
+
+
+def _wrap_up_report(subagent: ToolCallingAgent) -> str:
+    """Report from what is in the agent's memory (system prompt, task, tool calls and results)."""
+    messages = subagent.write_memory_to_messages()
+    messages.append(ChatMessage(role=MessageRole.USER, content=[{"type": "text", "text": SUBAGENT_WRAP_UP_PROMPT}]))
+    return subagent.model.generate(messages).content or ""
+
 # ============================================================
 # MAIN ORCHESTRATION (no coordinator agent needed)
 # ============================================================
 
-def run_deep_research(user_query: str, parallel: bool = True, max_workers: int = 10) -> str:
+def run_deep_research(
+    user_query: str,
+    parallel: bool = True,
+    max_workers: int = 10,
+    on_report_chunk: Optional[Callable[[str], None]] = None,
+    on_usage_summary: Optional[Callable[[dict], None]] = None
+) -> str:
     """
     Execute deep research on a user query.
     
@@ -329,10 +660,35 @@ def run_deep_research(user_query: str, parallel: bool = True, max_workers: int =
         user_query: The research question
         parallel: Whether to run subtasks in parallel
         max_workers: Max concurrent subagents (if parallel=True)
+        on_report_chunk: Called with each piece of the final report while
+            it is streamed (e.g. to print it and append it to a file)
+        on_usage_summary: Called with the run's LLM usage summary (tokens,
+            latency, cost per phase, subtask and call; JSON-serializable)
     
     Returns:
         Final synthesized research report
     """
+    # Run-wide state, picked up by the tools through context variables
+    run = RunState()
+    run_token = current_run.set(run)
+    ledger_token = current_ledger.set(run.usage)
+    try:
+        final_report = _run_pipeline(user_query, parallel, max_workers, run, on_report_chunk)
+    finally:
+        current_ledger.reset(ledger_token)
+        current_run.reset(run_token)
+
+    _report_usage(run, on_usage_summary)
+    return final_report
+
+
+def _run_pipeline(
+    user_query: str,
+    parallel: bool,
+    max_workers: int,
+    run: RunState,
+    on_report_chunk: Optional[Callable[[str], None]]
+) -> str:
     # *************
     # 1 - Generate research plan
     # *************
@@ -341,50 +697,94 @@ def run_deep_research(user_query: str, parallel: bool = True, max_workers: int =
     
     # *************
     # 2 - Split into subtasks
-    # *************
-    print()
-    print("\033[93m[Phase 2] Generating Subtasks\033[0m")
-    subtasks = split_into_subtasks(research_plan)
-    print(f"  → {len(subtasks)} subtasks identified")
-    
-    # *************
     # 3 - Execute subtasks (parallel)
     # *************
     print()
-    print(f"\033[93m[Phase 3] Executing Subtasks ({'parallel' if parallel else 'sequential'})\033[0m")
-    results: list[SubtaskResult] = []
+    if SPLITTER_STREAMING:
+        # Subtasks are handed to the executor while the splitter is still writing
+        print("\033[93m[Phase 2+3] Generating and Executing Subtasks (streaming)\033[0m")
+        subtasks = stream_subtasks(research_plan)
+    else:
+        print("\033[93m[Phase 2] Generating Subtasks\033[0m")
+        subtasks = split_into_subtasks(research_plan)
+        print(f"  → {len(subtasks)} subtasks identified")
+        print()
+        print(f"\033[93m[Phase 3] Executing Subtasks ({'parallel' if parallel else 'sequential'})\033[0m")
+
+    results = _run_subtasks(subtasks, user_query, research_plan, max_workers, announce=SPLITTER_STREAMING)
     
-    results = _run_subtasks(subtasks, user_query, research_plan, max_workers)
+    _print_io_stats(run)
     
     # *************
     # 4 - Log any failures
     # *************
-    failed = [r for r in results if not r.success]
-    if failed:
-        print()
-        print(f"\033[91m  ⚠ {len(failed)} subtask(s) had errors\033[0m")
-        for r in failed:
-            print(f"    - {r.subtask_id}: {r.error}")
+    _print_failures(results)
 
     # *************
     # 5 - Synthesize final report
     # *************
     print()
     print("\033[93m[Phase 4] Synthesizing Final Report\033[0m")
-    final_report = _synthesize_report(user_query, research_plan, results)
+    final_report = _synthesize_report(user_query, research_plan, results, on_chunk=on_report_chunk)
+    
+    for stage, stats in llm_cache_stats().items():
+        print(f"  → LLM cache ({stage}): {stats['hits']} hits, {stats['misses']} misses")
+    _print_client_stats()
     
     return final_report
 
 
+def _print_client_stats():
+    """Print how often models and provider connections were reused (this process)."""
+    models = model_registry_stats()
+    connections = connection_stats()
+    print(f"  → models: {models['created']} created, {models['reused']} reused")
+    if connections["requests"]:
+        print(
+            f"  → LLM connections: {connections['requests']} requests,"
+            f" {connections['new_connections']} new connections, {connections['reused']} reused"
+        )
+    _print_governor_stats()
+
+
+def _print_governor_stats():
+    """Print retries, 429s, timeouts and the current concurrency limit per LLM endpoint (this process)."""
+    for stage, stats in governor_stats().items():
+        if stats["calls"]:
+            print(
+                f"  → LLM governor ({stage}): {stats['calls']} calls, {stats['retries']} retries,"
+                f" {stats['rate_limited']} rate limited, {stats['timed_out']} timed out, concurrency {stats['limit']:.1f}/{stats['max_in_flight']}"
+            )
+
+
+def _print_failures(results: list[SubtaskResult]):
+    failed = [r for r in results if not r.success]
+    if failed:
+        print()
+        print(f"\033[91m  ⚠ {len(failed)} subtask(s) had errors\033[0m")
+        for r in failed:
+            print(f"    - {r.subtask_id}: {r.error}")
+    partial = [r for r in results if r.partial]
+    if partial:
+        print(f"\033[93m  ⚠ {len(partial)} subtask(s) stopped early with a partial report\033[0m")
+        for r in partial:
+            print(f"    - {r.subtask_id}: {r.partial_reason} budget used up")
+
+
 def _run_subtasks(
-    subtasks: list[dict],
+    subtasks: Iterable[dict],
     user_query: str,
     research_plan: str,
-    max_workers: int
+    max_workers: int,
+    announce: bool = False
 ) -> list[SubtaskResult]:
     """
     Run subtasks concurrently with a thread pool.
     
+    `subtasks` may be a generator (streaming splitter): every subtask is
+    submitted as soon as it arrives, `announce` prints each one. Results
+    keep the order of the subtasks.
+
     If you want a simple sequential run, use:
         return [
             run_subagent(subtask, user_query, research_plan)
@@ -392,50 +792,190 @@ def _run_subtasks(
         ]
     instead of threadding.
     """
-    results = []
+    results = {}
+    run = current_run.get()
     
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_subtask = {
-            executor.submit(run_subagent, subtask, user_query, research_plan): subtask
-            for subtask in subtasks
-        }
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    future_to_subtask = {}
+    deadline_missed = False
+    try:
+        for index, subtask in enumerate(subtasks):
+            if announce:
+                print(f"  → Subtask {subtask['id']} queued: {subtask['title']}")
+            # Each subagent gets a copy of the run's context (run-wide state)
+            future = executor.submit(copy_context().run, run_subagent, subtask, user_query, research_plan)
+            future_to_subtask[future] = (index, subtask)
+
+        if announce:
+            print(f"  → {len(future_to_subtask)} subtasks identified")
         
-        for future in as_completed(future_to_subtask):
-            subtask = future_to_subtask[future]
-            try:
-                result = future.result()
-                results.append(result)
-            except Exception as e:
-                logger.error(f"Subtask {subtask['id']} raised exception: {e}")
-                results.append(SubtaskResult(
-                    subtask["id"], 
-                    subtask["title"],
-                    f"[Fatal error: {e}]",
-                    success=False,
-                    error=str(e)
-                ))
-    
-    # Sort by original order for consistent output
-    id_order = {s["id"]: i for i, s in enumerate(subtasks)}
-    results.sort(key=lambda r: id_order.get(r.subtask_id, 999))
+        try:
+            timeout = run.remaining() if run is not None else None
+            for future in as_completed(future_to_subtask, timeout=timeout):
+                index, subtask = future_to_subtask[future]
+                try:
+                    results[index] = future.result()
+                except Exception as e:
+                    logger.error(f"Subtask {subtask['id']} raised exception: {e}")
+                    results[index] = SubtaskResult(
+                        subtask["id"], 
+                        subtask["title"],
+                        f"[Fatal error: {e}]",
+                        success=False,
+                        error=str(e)
+                    )
+        except TimeoutError:
+            # Synthesis starts now; unfinished subagents stop at their next step
+            deadline_missed = True
+            run.stopped = True
+            print(f"\033[91m  ⚠ Run deadline reached, {len(future_to_subtask) - len(results)} subtask(s) unfinished\033[0m")
+            for future, (index, subtask) in future_to_subtask.items():
+                if index not in results:
+                    results[index] = SubtaskResult(
+                        subtask["id"],
+                        subtask["title"],
+                        ABANDONED_REPORT,
+                        success=False,
+                        error="Run deadline reached"
+                    )
+    finally:
+        # Don't wait for subagents that missed the deadline, drop queued ones
+        executor.shutdown(wait=not deadline_missed, cancel_futures=True)
     
-    return results
+    # Original order for consistent output
+    return [results[index] for index in sorted(results)]
+
+
+def _combined_stats(*flights) -> dict:
+    stats = [flight.stats() for flight in flights]
+    return {name: sum(s[name] for s in stats) for name in ("executed", "coalesced")}
+
+
+def _print_io_stats(run: RunState):
+    """Print how much duplicate fetch/search work and content was avoided."""
+    # Sync and async engine share the counters
+    fetches = _combined_stats(fetch_flight, async_fetch_flight)
+    searches = _combined_stats(search_flight, async_search_flight)
+    evidence = run.evidence.stats()
+    dups = run.duplicates.stats()
+    print(
+        f"  → fetches: {fetches['executed']} executed, {fetches['coalesced']} coalesced"
+        f" | searches: {searches['executed']} executed, {searches['coalesced']} coalesced"
+    )
+    print(
+        f"  → evidence registry: {evidence['urls']} pages, {evidence['reuses']} reuses"
+        f" ({evidence['cross_subagent_reuses']} across subagents)"
+    )
+    for name, cache in (("fetch cache", fetch_cache), ("search cache", search_cache)):
+        if cache is not None:
+            stats = cache.stats()
+            print(f"  → {name}: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%})")
+    latency = backend_latency_stats()
+    for backend, scheduler in search_schedulers.items():
+        stats = latency.get(backend, {"calls": 0, "avg": 0.0, "max": 0.0})
+        limits = scheduler.stats()
+        print(
+            f"  → {backend}: {stats['calls']} calls, avg {stats['avg']:.2f}s, max {stats['max']:.2f}s"
+            f" | {limits['rejected']} turned away, {limits['trips']} rate-limit/quota trips"
+        )
+    print(
+        f"  → near-duplicates: {dups['duplicates']} of {dups['pages_checked']} pages,"
+        f" {dups['bytes_saved']} bytes saved"
+    )
+
+
+def _report_usage(run: RunState, on_usage_summary: Optional[Callable[[dict], None]]):
+    """Print the run's LLM usage per phase and hand the full summary to the caller."""
+    summary = run.usage.summary()
+    for phase, totals in summary["phases"].items():
+        print(
+            f"  → usage ({phase}): {totals['calls']} calls, {totals['prompt_tokens']} prompt"
+            f" + {totals['completion_tokens']} completion tokens ({totals['cached_tokens']} cached),"
+            f" {totals['latency']:.1f}s, ${totals['cost']:.4f}"
+        )
+    if summary["unpriced_models"]:
+        print(f"  → no prices known for {', '.join(summary['unpriced_models'])} (counted as $0)")
+    _print_prompt_cache_stats(summary)
+    if on_usage_summary is not None:
+        on_usage_summary(summary)
+
+
+def _print_prompt_cache_stats(summary: dict):
+    """Print the input tokens of the run the providers served from their prompt cache, per phase."""
+    for phase, totals in summary["phases"].items():
+        input_tokens = totals["prompt_tokens"]
+        cached_tokens = totals["cached_tokens"]
+        if not input_tokens:
+            continue
+        print(
+            f"  → prompt cache ({phase}): {cached_tokens} of {input_tokens} input tokens cached"
+            f" ({cached_tokens / input_tokens:.0%}), {input_tokens - cached_tokens} uncached"
+        )
+
+
+def _stream_report(
+    model: LiteLLMModel,
+    messages: list[dict],
+    on_chunk: Callable[[str], None]
+) -> Iterator[str]:
+    """Yield the report text as it arrives, passing every piece to `on_chunk`."""
+    for delta in model.generate_stream(messages=messages):
+        if delta.content:
+            on_chunk(delta.content)
+            yield delta.content
 
 
 def _synthesize_report(
     user_query: str,
     research_plan: str,
-    results: list[SubtaskResult]
+    results: list[SubtaskResult],
+    on_chunk: Optional[Callable[[str], None]] = None
 ) -> str:
-    """Combine all subtask reports into a final synthesis."""
+    """
+    Combine all subtask reports into a final synthesis.
+    
+    With `on_chunk`, the report is streamed and handed over piece by piece
+    as it is generated. Providers without streaming support fall back to a
+    single blocking call (`on_chunk` is then not called).
+    """
+    messages = _synthesis_messages(user_query, research_plan, results)
+
+    # *************
+    # Create report
+    # *************
+    synthesis_model = get_model()
+
+    if on_chunk is not None and SYNTHESIS_STREAMING:
+        try:
+            report = "".join(_stream_report(synthesis_model, messages, on_chunk))
+            if report:
+                return report
+            logger.warning("Streaming synthesis returned no content, retrying without streaming")
+        except Exception as e:
+            logger.warning(f"Streaming synthesis failed, retrying without streaming: {e}")
+
+    response = synthesis_model.generate(messages=messages)
+    
+    content = response.content
+
+    if isinstance(content, str):
+        return content
+    
+    return str(content) if content else ""
+
+
+def _synthesis_messages(user_query: str, research_plan: str, results: list[SubtaskResult]) -> list[dict]:
     # *************
     # Format reports for the synthesis prompt
     # *************
     report_sections = []
     for r in results:
-        status = "" if r.success else " [PARTIAL]"
+        status = "" if r.success and not r.partial else " [PARTIAL]"
         report_sections.append(f"=== Subtask {r.subtask_id}: {r.title}{status} ===\n{r.report}")
-    
+
+    # Condense the reports first if they don't fit into the synthesis budget
+    report_sections = _condense_to_budget(user_query, research_plan, report_sections)
+
     subagent_reports_text = "\n\n".join(report_sections)
     
     synthesis_prompt = COORDINATOR_SYNTHESIS_PROMPT_TEMPLATE.format(
@@ -444,17 +984,93 @@ def _synthesize_report(
         subagent_reports=subagent_reports_text,
     )
 
-    # *************
-    # Create report
-    # *************
-    synthesis_model = get_model()
-    response = synthesis_model.generate(
-        messages=[{"role": "user", "content": synthesis_prompt}]
+    return [
+        {"role": "system", "content": COORDINATOR_SYNTHESIS_SYSTEM_PROMPT},
+        {"role": "user", "content": synthesis_prompt},
+    ]
+
+
+def _count_tokens(text: str) -> int:
+    """Token count for the coordinator model (rough estimate if unknown)."""
+    try:
+        return litellm.token_counter(model=LLM_COORDINATOR_MODEL, text=text)
+    except Exception:
+        return len(text) // 4
+
+
+def _condense_to_budget(user_query: str, research_plan: str, sections: list[str]) -> list[str]:
+    """
+    Map-reduce the report sections down to the synthesis input budget.
+
+    Inputs within SYNTHESIS_MAX_INPUT_TOKENS are returned unchanged (single
+    pass). Otherwise the sections are grouped into batches of about
+    SYNTHESIS_BATCH_TOKENS, every batch is condensed in parallel, and the
+    condensed notes take the place of the reports. This repeats (up to
+    SYNTHESIS_MAX_LEVELS) until the notes fit.
+    """
+    overhead = _count_tokens(COORDINATOR_SYNTHESIS_SYSTEM_PROMPT) + _count_tokens(
+        COORDINATOR_SYNTHESIS_PROMPT_TEMPLATE.format(
+            user_query=user_query, research_plan=research_plan, subagent_reports="",
+        )
     )
-    
-    content = response.content
+    budget = max(SYNTHESIS_MAX_INPUT_TOKENS - overhead, 1000)
 
-    if isinstance(content, str):
-        return content
-    
-    return str(content) if content else ""
\ No newline at end of file
+    for level in range(1, SYNTHESIS_MAX_LEVELS + 1):
+        sizes = [_count_tokens(section) for section in sections]
+        total = sum(sizes)
+        if total <= budget:
+            return sections
+
+        batches = _batch_sections(sections, sizes)
+        if len(batches) == 1 and level > 1:
+            # A single batch was already condensed and is still too large
+            break
+        target_tokens = max(budget // len(batches), 500)
+        print(
+            f"  → Synthesis input {total} tokens over budget ({budget}), condensing"
+            f" {len(sections)} reports in {len(batches)} batches (level {level})"
+        )
+        sections = _condense_batches(user_query, batches, target_tokens)
+
+    logger.warning("Synthesis input still over budget after condensing, synthesizing anyway")
+    return sections
+
+
+def _batch_sections(sections: list[str], sizes: list[int]) -> list[list[str]]:
+    """Group consecutive sections into batches of at most SYNTHESIS_BATCH_TOKENS."""
+    batches: list[list[str]] = []
+    batch_tokens = 0
+    for section, size in zip(sections, sizes):
+        if not batches or batch_tokens + size > SYNTHESIS_BATCH_TOKENS:
+            batches.append([])
+            batch_tokens = 0
+        batches[-1].append(section)
+        batch_tokens += size
+    return batches
+
+
+def _condense_batches(user_query: str, batches: list[list[str]], target_tokens: int) -> list[str]:
+    """Condense every batch into one section of notes, in parallel, keeping the order."""
+    def condense(index: int, batch: list[str]) -> str:
+        prompt = SYNTHESIS_CONDENSE_PROMPT_TEMPLATE.format(
+            user_query=user_query,
+            target_words=int(target_tokens * 0.75),
+            reports="\n\n".join(batch),
+        )
+        try:
+            response = get_model().generate(messages=[{"role": "user", "content": prompt}])
+            notes = response.content if isinstance(response.content, str) else str(response.content or "")
+            if notes:
+                return f"=== Condensed notes {index + 1} ===\n{notes}"
+            logger.warning(f"Condensing batch {index + 1} returned no content, keeping it as is")
+        except Exception as e:
+            logger.warning(f"Condensing batch {index + 1} failed, keeping it as is: {e}")
+        return "\n\n".join(batch)
+
+    with ThreadPoolExecutor(max_workers=SYNTHESIS_MAP_WORKERS) as executor:
+        # The run's context goes along (usage accounting)
+        futures = [
+            executor.submit(copy_context().run, condense, index, batch)
+            for index, batch in enumerate(batches)
+        ]
+        return [future.result() for future in futures]
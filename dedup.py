@@ -0,0 +1,95 @@
+import hashlib
+import re
+import threading
+from collections import Counter
+from typing import Optional
+
+FINGERPRINT_BITS = 64
+SHINGLE_SIZE = 3
+
+# Pages shorter than this are too small for a meaningful fingerprint
+MIN_WORDS = 50
+
+WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def simhash(text: str) -> Optional[int]:
+    """64-bit SimHash over word 3-shingles, None for very short texts."""
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) < MIN_WORDS:
+        return None
+
+    shingles = Counter(
+        " ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)
+    )
+
+    weights = [0] * FINGERPRINT_BITS
+    for shingle, count in shingles.items():
+        h = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(FINGERPRINT_BITS):
+            weights[bit] += count if h >> bit & 1 else -count
+
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def similarity(a: int, b: int) -> float:
+    """Share of equal bits between two fingerprints (1.0 = identical)."""
+    return 1 - bin(a ^ b).count("1") / FINGERPRINT_BITS
+
+
+class NearDuplicateIndex:
+    """
+    Run-wide index of page fingerprints.
+
+    `check()` returns the URL of an already seen page whose content is at
+    least `threshold` similar, or registers the page and returns None.
+    The same URL is never reported as its own duplicate.
+    """
+    def __init__(self, threshold: float = 0.85):
+        self.threshold = threshold
+        self.pages_checked = 0
+        self.duplicates = 0
+        self.bytes_saved = 0
+        self._seen: list[tuple[int, str]] = []
+        self._lock = threading.Lock()
+
+    def check(self, url: str, content: str) -> Optional[str]:
+        fingerprint = simhash(content)
+
+        with self._lock:
+            self.pages_checked += 1
+            if fingerprint is None:
+                return None
+
+            for seen_fingerprint, seen_url in self._seen:
+                if seen_url != url and similarity(fingerprint, seen_fingerprint) >= self.threshold:
+                    self.duplicates += 1
+                    return seen_url
+
+            if all(seen_url != url for _, seen_url in self._seen):
+                self._seen.append((fingerprint, url))
+            return None
+
+    def record_saving(self, original: str, replacement: str):
+        with self._lock:
+            self.bytes_saved += max(0, len(original.encode("utf-8")) - len(replacement.encode("utf-8")))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "pages_checked": self.pages_checked,
+                "duplicates": self.duplicates,
+                "bytes_saved": self.bytes_saved,
+            }
+
+
+def duplicate_reference(seen_url: str) -> str:
+    """Short stand-in for a page whose text was already retrieved in this run."""
+    return (
+        f"[Near-duplicate of {seen_url}, which was already retrieved in this research run. "
+        f"Content omitted; use fetch_page on that URL if you need the full text.]"
+    )
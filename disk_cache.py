@@ -0,0 +1,169 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.environ.get("CACHE_DIR", ".cache")
+
+# Expired and over-budget entries are evicted once per this many writes
+# (per process), so the cache may briefly exceed max_bytes by that many values
+EVICT_EVERY = 32  # writes
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """SQLite connection set up for concurrent use by several processes."""
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class DiskCache:
+    """
+    Persistent key/value cache on SQLite with TTL and LRU eviction.
+
+    - Safe across threads (one connection per thread) and across processes
+      on one host (SQLite WAL mode + busy timeout).
+    - Entries older than `ttl` seconds are treated as missing.
+    - When the stored values exceed `max_bytes`, the least recently used
+      entries are evicted (checked every EVICT_EVERY writes).
+    """
+    def __init__(self, name: str, ttl: float, max_bytes: int, cache_dir: str = CACHE_DIR):
+        self.name = name
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.path = os.path.join(cache_dir, f"{name}.sqlite")
+
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._stats_lock = threading.Lock()
+        self._local = threading.local()
+
+        os.makedirs(cache_dir, exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                meta TEXT,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries (accessed_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_created ON entries (created_at)")
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        """Stable key from arbitrary parts (hashed, so long inputs are fine)."""
+        raw = "\x1f".join(str(p) for p in parts)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = connect(self.path)
+            self._local.conn = conn
+        return conn
+
+    def _count(self, hit: bool):
+        with self._stats_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get_with_meta(self, key: str) -> tuple[Optional[str], Optional[str]]:
+        """Return (value, meta) or (None, None) on a miss."""
+        try:
+            conn = self._conn()
+            row = conn.execute(
+                "SELECT value, meta, created_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            now = time.time()
+            if row is None or now - row[2] > self.ttl:
+                self._count(hit=False)
+                return None, None
+
+            conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+            self._count(hit=True)
+            return row[0], row[1]
+        except sqlite3.Error as e:
+            logger.warning(f"Cache '{self.name}' read failed: {e}")
+            self._count(hit=False)
+            return None, None
+
+    def get(self, key: str) -> Optional[str]:
+        return self.get_with_meta(key)[0]
+
+    def set(self, key: str, value: str, meta: Optional[str] = None):
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+
+        now = time.time()
+        try:
+            conn = self._conn()
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, meta, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, value, meta, size, now, now),
+            )
+            with self._stats_lock:
+                self._writes += 1
+                evict = self._writes % EVICT_EVERY == 0
+            if evict:
+                self._evict(conn, now)
+        except sqlite3.Error as e:
+            logger.warning(f"Cache '{self.name}' write failed: {e}")
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        # IMMEDIATE takes the write lock up front, so concurrent processes
+        # don't evict the same rows twice.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM entries WHERE created_at < ?", (now - self.ttl,))
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total > self.max_bytes:
+                excess = total - self.max_bytes
+                freed = 0
+                stale_keys = []
+                for key, size in conn.execute("SELECT key, size FROM entries ORDER BY accessed_at ASC"):
+                    stale_keys.append((key,))
+                    freed += size
+                    if freed >= excess:
+                        break
+                conn.executemany("DELETE FROM entries WHERE key = ?", stale_keys)
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+
+    def stats(self) -> dict:
+        """Hit/miss counters of this process plus the current on-disk size."""
+        try:
+            entries, total = self._conn().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+        except sqlite3.Error:
+            entries, total = None, None
+
+        with self._stats_lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": total,
+        }
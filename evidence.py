@@ -0,0 +1,119 @@
+import asyncio
+import threading
+import time
+from typing import Awaitable, Callable, Optional
+
+from scraper import normalize_url
+
+
+class EvidenceEntry:
+    """One fetched page and who asked for it during the run."""
+    def __init__(self, url: str, content: Optional[str], fetched_by: str):
+        self.url = url
+        self.content = content
+        self.fetched_by = fetched_by
+        self.requested_by = {fetched_by}
+        self.fetched_at = time.time()
+
+
+class EvidenceRegistry:
+    """
+    Run-wide registry of fetched pages, shared by all subagents of a run.
+
+    The first request for a URL fetches it; later requests (from the same or
+    another subagent) are served from the registry. Pages the fetcher found
+    no content for are recorded too, so a dead page is not retried within
+    the run. After an exception or a cancellation the next request fetches
+    the URL again.
+    """
+    def __init__(self):
+        self.fetches = 0
+        self.reuses = 0
+        self.cross_subagent_reuses = 0
+        self._entries: dict[str, EvidenceEntry] = {}
+        self._pending: dict[str, threading.Event] = {}
+        # Fetches in flight on the event loop (async engine)
+        self._async_pending: dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+
+    def fetch(self, url: str, fetcher: Callable[[str], Optional[str]], requester: str) -> Optional[str]:
+        key = normalize_url(url)
+
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self.reuses += 1
+                    if requester not in entry.requested_by:
+                        self.cross_subagent_reuses += 1
+                        entry.requested_by.add(requester)
+                    return entry.content
+
+                pending = self._pending.get(key)
+                if pending is None:
+                    self._pending[key] = threading.Event()
+                    break
+            # Someone else is fetching this URL right now, use their result
+            pending.wait()
+
+        fetched = False
+        try:
+            content = fetcher(url)
+            fetched = True
+            return content
+        finally:
+            with self._lock:
+                self.fetches += 1
+                if fetched:
+                    self._entries[key] = EvidenceEntry(url, content, requester)
+                self._pending.pop(key).set()
+
+    async def afetch(
+        self,
+        url: str,
+        fetcher: Callable[[str], Awaitable[Optional[str]]],
+        requester: str
+    ) -> Optional[str]:
+        """fetch() for the event loop: waiting for a pending fetch doesn't block the loop."""
+        key = normalize_url(url)
+
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self.reuses += 1
+                    if requester not in entry.requested_by:
+                        self.cross_subagent_reuses += 1
+                        entry.requested_by.add(requester)
+                    return entry.content
+
+                pending = self._async_pending.get(key)
+                if pending is None:
+                    self._async_pending[key] = asyncio.get_running_loop().create_future()
+                    break
+            await asyncio.shield(pending)
+
+        fetched = False
+        try:
+            content = await fetcher(url)
+            fetched = True
+            return content
+        finally:
+            with self._lock:
+                self.fetches += 1
+                if fetched:
+                    self._entries[key] = EvidenceEntry(url, content, requester)
+                self._async_pending.pop(key).set_result(None)
+
+    def entries(self) -> list[EvidenceEntry]:
+        with self._lock:
+            return list(self._entries.values())
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "urls": len(self._entries),
+                "fetches": self.fetches,
+                "reuses": self.reuses,
+                "cross_subagent_reuses": self.cross_subagent_reuses,
+            }
@@ -0,0 +1,170 @@
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+
+from disk_cache import CACHE_DIR, connect
+
+logger = logging.getLogger(__name__)
+
+# ******************************
+# Routing configuration
+# ******************************
+FETCH_ROUTER_HALF_LIFE = float(os.environ.get("FETCH_ROUTER_HALF_LIFE", 3 * 24 * 3600))  # seconds
+FETCH_ROUTER_MIN_SAMPLES = float(os.environ.get("FETCH_ROUTER_MIN_SAMPLES", 3))
+FETCH_ROUTER_FAILURE_RATE = float(os.environ.get("FETCH_ROUTER_FAILURE_RATE", 0.8))
+# Share of fetches on "browser"/"skip" domains that take the full path anyway
+FETCH_ROUTER_PROBE_RATE = float(os.environ.get("FETCH_ROUTER_PROBE_RATE", 0.05))
+
+STATIC = "static"
+BROWSER = "browser"
+SKIP = "skip"
+
+
+class DomainStats:
+    """Decayed outcome counts of one fetch strategy on one domain."""
+    def __init__(self, successes: float = 0.0, failures: float = 0.0, latency: float = 0.0):
+        self.successes = successes
+        self.failures = failures
+        self.latency = latency  # moving average, seconds
+
+    @property
+    def samples(self) -> float:
+        return self.successes + self.failures
+
+    @property
+    def failure_rate(self) -> float:
+        return self.failures / self.samples if self.samples else 0.0
+
+
+class FetchRouter:
+    """
+    Persistent per-domain table of which fetch strategy works.
+
+    For every (domain, strategy) it keeps success and failure counts plus a
+    moving average of the latency. Counts decay with FETCH_ROUTER_HALF_LIFE,
+    so old verdicts fade out and a domain gets re-tried eventually.
+
+    Decisions:
+    - "static" by default, i.e. try the plain HTTP scraper first
+    - "browser" if the static scraper keeps failing on this domain, or if
+      trying it first is slower on average than going straight to the browser
+    - "skip" if both strategies keep failing
+
+    A FETCH_ROUTER_PROBE_RATE share of "browser" and "skip" decisions turns
+    into "static" (static, then browser), so both strategies get fresh
+    samples and a domain that works again wins its way back.
+    """
+    def __init__(self, cache_dir: str = CACHE_DIR, half_life: float = FETCH_ROUTER_HALF_LIFE):
+        self.half_life = half_life
+        self.path = os.path.join(cache_dir, "fetch_router.sqlite")
+        self._local = threading.local()
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._conn().execute(
+            """
+            CREATE TABLE IF NOT EXISTS domains (
+                domain TEXT NOT NULL,
+                strategy TEXT NOT NULL,
+                successes REAL NOT NULL,
+                failures REAL NOT NULL,
+                latency REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (domain, strategy)
+            )
+            """
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = connect(self.path)
+            self._local.conn = conn
+        return conn
+
+    def _decay(self, updated_at: float, now: float) -> float:
+        return 0.5 ** ((now - updated_at) / self.half_life)
+
+    def stats(self, domain: str) -> dict[str, DomainStats]:
+        now = time.time()
+        result = {STATIC: DomainStats(), BROWSER: DomainStats()}
+        try:
+            rows = self._conn().execute(
+                "SELECT strategy, successes, failures, latency, updated_at FROM domains WHERE domain = ?",
+                (domain,),
+            ).fetchall()
+        except sqlite3.Error as e:
+            logger.warning(f"Fetch router read failed: {e}")
+            return result
+
+        for strategy, successes, failures, latency, updated_at in rows:
+            factor = self._decay(updated_at, now)
+            result[strategy] = DomainStats(successes * factor, failures * factor, latency)
+        return result
+
+    def choose(self, domain: str) -> str:
+        stats = self.stats(domain)
+        static, browser = stats[STATIC], stats[BROWSER]
+
+        static_failing = (
+            static.samples >= FETCH_ROUTER_MIN_SAMPLES
+            and static.failure_rate >= FETCH_ROUTER_FAILURE_RATE
+        )
+        browser_failing = (
+            browser.samples >= FETCH_ROUTER_MIN_SAMPLES
+            and browser.failure_rate >= FETCH_ROUTER_FAILURE_RATE
+        )
+
+        if static_failing and browser_failing:
+            route = SKIP
+        elif static_failing or self._static_first_slower(static, browser):
+            route = BROWSER
+        else:
+            return STATIC
+
+        if random.random() < FETCH_ROUTER_PROBE_RATE:
+            return STATIC
+        return route
+
+    @staticmethod
+    def _static_first_slower(static: DomainStats, browser: DomainStats) -> bool:
+        """Static first costs its own latency plus the browser's whenever it fails."""
+        if static.samples < FETCH_ROUTER_MIN_SAMPLES or browser.samples < FETCH_ROUTER_MIN_SAMPLES:
+            return False
+        return static.latency + static.failure_rate * browser.latency > browser.latency
+
+    def record(self, domain: str, strategy: str, success: bool, latency: float):
+        now = time.time()
+        conn = self._conn()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT successes, failures, latency, updated_at FROM domains WHERE domain = ? AND strategy = ?",
+                (domain, strategy),
+            ).fetchone()
+            if row is None:
+                successes, failures, avg_latency = 0.0, 0.0, latency
+            else:
+                factor = self._decay(row[3], now)
+                successes, failures = row[0] * factor, row[1] * factor
+                avg_latency = 0.7 * row[2] + 0.3 * latency
+
+            if success:
+                successes += 1
+            else:
+                failures += 1
+
+            conn.execute(
+                "INSERT OR REPLACE INTO domains (domain, strategy, successes, failures, latency, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (domain, strategy, successes, failures, avg_latency, now),
+            )
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            logger.warning(f"Fetch router write failed: {e}")
+            try:
+                conn.execute("ROLLBACK")
+            except sqlite3.Error:
+                pass
@@ -0,0 +1,107 @@
+import asyncio
+import os
+import threading
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# ******************************
+# Pool configuration
+# ******************************
+HTTP_POOL_CONNECTIONS = int(os.environ.get("HTTP_POOL_CONNECTIONS", 32))  # number of hosts kept alive
+HTTP_POOL_MAXSIZE = int(os.environ.get("HTTP_POOL_MAXSIZE", 8))  # connections per host
+HTTP_MAX_RETRIES = int(os.environ.get("HTTP_MAX_RETRIES", 2))
+HTTP_BACKOFF_FACTOR = float(os.environ.get("HTTP_BACKOFF_FACTOR", 0.5))
+
+# Transient server errors worth another try. 429 is left to the caller,
+# retrying a quota error only burns more quota.
+RETRY_STATUS_CODES = (500, 502, 503, 504)
+
+_sessions: dict[str, requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+
+def _build_session(headers: dict | None) -> requests.Session:
+    retry = Retry(
+        total=HTTP_MAX_RETRIES,
+        connect=HTTP_MAX_RETRIES,
+        # A read timeout already cost the full timeout; a slow host gets one
+        # try and the caller (e.g. the Playwright fallback) takes over
+        read=False,
+        status=HTTP_MAX_RETRIES,
+        backoff_factor=HTTP_BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUS_CODES,
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    # pool_block=True turns pool_maxsize into a hard per-host connection limit
+    adapter = HTTPAdapter(
+        pool_connections=HTTP_POOL_CONNECTIONS,
+        pool_maxsize=HTTP_POOL_MAXSIZE,
+        max_retries=retry,
+        pool_block=True,
+    )
+
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    if headers:
+        session.headers.update(headers)
+    return session
+
+
+def get_session(name: str, headers: dict | None = None) -> requests.Session:
+    """
+    Shared keep-alive session, one per name (e.g. "scraper", "search").
+
+    Sessions are created once and reused by all threads, so repeated requests
+    to the same host skip the TCP + TLS handshake. `headers` only apply when
+    the session is first created.
+    """
+    session = _sessions.get(name)
+    if session is not None:
+        return session
+
+    with _sessions_lock:
+        if name not in _sessions:
+            _sessions[name] = _build_session(headers)
+        return _sessions[name]
+
+
+# ******************************
+# Async clients (async engine)
+# ******************************
+# httpx clients are bound to the event loop they are used on
+_async_clients: dict[tuple[int, str], httpx.AsyncClient] = {}
+
+
+def get_async_client(name: str, headers: dict | None = None) -> httpx.AsyncClient:
+    """
+    Async counterpart of get_session(): one shared keep-alive client per name
+    and event loop, with the same connection limits. Only connection errors
+    are retried (httpx has no status-based retries).
+    """
+    key = (id(asyncio.get_running_loop()), name)
+    client = _async_clients.get(key)
+    if client is None:
+        client = httpx.AsyncClient(
+            headers=headers,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=HTTP_POOL_CONNECTIONS * HTTP_POOL_MAXSIZE,
+                max_keepalive_connections=HTTP_POOL_CONNECTIONS,
+            ),
+            transport=httpx.AsyncHTTPTransport(retries=HTTP_MAX_RETRIES),
+        )
+        _async_clients[key] = client
+    return client
+
+
+async def aclose_async_clients():
+    """Close the async clients of the running event loop."""
+    loop_id = id(asyncio.get_running_loop())
+    for key in [key for key in _async_clients if key[0] == loop_id]:
+        await _async_clients.pop(key).aclose()
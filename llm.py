@@ -0,0 +1,396 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+import weakref
+from typing import Any, AsyncIterator, Iterator
+
+import httpx
+import litellm
+from litellm.types.utils import Delta, ModelResponse, ModelResponseStream, StreamingChoices
+
+from disk_cache import DiskCache
+from llm_governor import (
+    FAILED,
+    LLM_MAX_RETRIES,
+    OK,
+    RATE_LIMITED,
+    TIMED_OUT,
+    EndpointGovernor,
+    backoff_delay,
+    llm_governors,
+)
+from usage import record_call
+
+logger = logging.getLogger(__name__)
+
+# Pipeline stages that talk to an LLM
+STAGES = ("planner", "splitter", "subagent", "synthesis")
+
+# ******************************
+# Response cache (opt-in)
+# ******************************
+# Comma-separated stages to cache, e.g. "planner,splitter" or "all"
+LLM_CACHE_STAGES = os.environ.get("LLM_CACHE_STAGES", "")
+LLM_CACHE_TTL = float(os.environ.get("LLM_CACHE_TTL", 7 * 24 * 3600))  # seconds
+LLM_CACHE_MAX_BYTES = int(os.environ.get("LLM_CACHE_MAX_BYTES", 128 * 1024 * 1024))
+
+_cached_stages = (
+    set(STAGES) if LLM_CACHE_STAGES.strip() == "all"
+    else {s.strip() for s in LLM_CACHE_STAGES.split(",") if s.strip()}
+)
+
+llm_cache = (
+    DiskCache("llm_cache", ttl=LLM_CACHE_TTL, max_bytes=LLM_CACHE_MAX_BYTES)
+    if _cached_stages else None
+)
+
+# Parameters that don't change the completion
+UNCACHED_PARAMS = {"api_key", "stream", "stream_options", "drop_params", "cache_control_injection_points"}
+
+_stage_stats: dict[str, dict[str, int]] = {stage: {"hits": 0, "misses": 0} for stage in STAGES}
+_stats_lock = threading.Lock()
+
+# ******************************
+# Provider prompt caching
+# ******************************
+# Mark the system message (the prefix shared by all calls of a stage) as
+# cacheable for providers with explicit cache control (e.g. Anthropic).
+# Providers with automatic prefix caching (e.g. OpenAI) don't need it.
+LLM_PROMPT_CACHE_CONTROL = os.environ.get("LLM_PROMPT_CACHE_CONTROL", "0") == "1"
+
+CACHE_CONTROL_INJECTION_POINTS = [{"location": "message", "role": "system"}]
+
+# ******************************
+# Shared HTTP client for provider calls
+# ******************************
+# One keep-alive connection pool for all (sync) OpenAI-compatible calls of
+# all stages, instead of a client per api key/base/timeout combination
+LLM_SHARED_HTTP_CLIENT = os.environ.get("LLM_SHARED_HTTP_CLIENT", "1") == "1"
+LLM_HTTP_MAX_CONNECTIONS = int(os.environ.get("LLM_HTTP_MAX_CONNECTIONS", 64))
+LLM_HTTP_KEEPALIVE = int(os.environ.get("LLM_HTTP_KEEPALIVE", 32))
+
+_connection_stats = {"requests": 0, "new_connections": 0}
+# Connections (network streams) seen so far; gone once httpx drops them
+_seen_connections = weakref.WeakSet()
+
+
+def _count_connection(response: httpx.Response):
+    stream = response.extensions.get("network_stream")
+    with _stats_lock:
+        _connection_stats["requests"] += 1
+        if stream is None:
+            return
+        if stream not in _seen_connections:
+            _seen_connections.add(stream)
+            _connection_stats["new_connections"] += 1
+
+
+if LLM_SHARED_HTTP_CLIENT and litellm.client_session is None:
+    litellm.client_session = httpx.Client(
+        limits=httpx.Limits(
+            max_connections=LLM_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_HTTP_KEEPALIVE,
+        ),
+        # litellm passes the request timeout per call, this is only the fallback
+        timeout=httpx.Timeout(600, connect=10),
+        follow_redirects=True,
+        event_hooks={"response": [_count_connection]},
+    )
+
+
+# Provider errors worth retrying a single completion for
+RETRYABLE_ERRORS = (
+    litellm.RateLimitError,
+    litellm.ServiceUnavailableError,
+    litellm.InternalServerError,
+    litellm.BadGatewayError,
+    litellm.Timeout,
+    litellm.APIConnectionError,
+)
+
+
+def _cache_key(kwargs: dict) -> str:
+    relevant = {k: v for k, v in kwargs.items() if k not in UNCACHED_PARAMS}
+    return DiskCache.make_key(json.dumps(relevant, sort_keys=True, default=str))
+
+
+def _count(stage: str, hit: bool):
+    with _stats_lock:
+        _stage_stats.setdefault(stage, {"hits": 0, "misses": 0})["hits" if hit else "misses"] += 1
+
+
+def completion(stage: str, **kwargs) -> Any:
+    """
+    litellm.completion for one pipeline stage, served from the on-disk
+    response cache when caching is enabled for that stage.
+
+    Works for plain and streamed (stream=True) calls; cached responses are
+    replayed as a single chunk in the streamed case.
+    """
+    if LLM_PROMPT_CACHE_CONTROL:
+        kwargs.setdefault("cache_control_injection_points", CACHE_CONTROL_INJECTION_POINTS)
+
+    if llm_cache is None or stage not in _cached_stages:
+        return _call(stage, kwargs)
+
+    key = _cache_key(kwargs)
+    cached = llm_cache.get(key)
+    _count(stage, hit=cached is not None)
+
+    if cached is not None:
+        response = ModelResponse(**json.loads(cached))
+        return _replay_as_stream(response) if kwargs.get("stream") else response
+
+    response = _call(stage, kwargs)
+    if kwargs.get("stream"):
+        return _record_stream(response, key, kwargs["messages"])
+
+    llm_cache.set(key, response.model_dump_json())
+    return response
+
+
+def _call(stage: str, kwargs: dict) -> Any:
+    """
+    litellm.completion through the stage's endpoint governor, counting the
+    (cached) input tokens it reports and recording the call in the run's
+    usage ledger. Rate limits and transient provider
+    errors are retried with jittered exponential backoff.
+    """
+    governor = llm_governors[stage]
+    estimate = _estimate_tokens(governor, kwargs)
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        reservation = governor.acquire(estimate)
+        try:
+            response = litellm.completion(**kwargs)
+        except RETRYABLE_ERRORS as e:
+            governor.release(reservation, _outcome(e))
+            if attempt == LLM_MAX_RETRIES:
+                raise
+            time.sleep(_retry_delay(stage, governor, attempt, e))
+            continue
+        except Exception:
+            governor.release(reservation, FAILED)
+            raise
+
+        if kwargs.get("stream"):
+            return _count_stream_usage(stage, kwargs.get("model", ""), response, governor, reservation)
+        usage = getattr(response, "usage", None)
+        record_call(stage, kwargs.get("model", ""), usage, time.monotonic() - reservation.started)
+        governor.release(reservation, OK, _total_tokens(usage))
+        return response
+
+
+def _count_stream_usage(stage: str, model: str, stream, governor: EndpointGovernor, reservation) -> Iterator:
+    # Usage arrives with the last chunk (stream_options={"include_usage": True}).
+    # The request holds its governor slot until the stream is consumed.
+    usage = None
+    outcome = FAILED
+    try:
+        for chunk in stream:
+            usage = getattr(chunk, "usage", None) or usage
+            yield chunk
+        outcome = OK
+    except RETRYABLE_ERRORS as e:
+        outcome = _outcome(e)
+        raise
+    finally:
+        governor.release(reservation, outcome, _total_tokens(usage))
+    record_call(stage, model, usage, time.monotonic() - reservation.started)
+
+
+def _estimate_tokens(governor: EndpointGovernor, kwargs: dict) -> int:
+    """Prompt tokens of a request, only needed for a tokens-per-minute limit."""
+    if not governor.tokens_per_minute:
+        return 0
+    try:
+        return litellm.token_counter(model=kwargs.get("model", ""), messages=kwargs.get("messages", []))
+    except Exception:
+        return len(json.dumps(kwargs.get("messages", []), default=str)) // 4
+
+
+def _total_tokens(usage) -> int | None:
+    return getattr(usage, "total_tokens", None) if usage is not None else None
+
+
+def _outcome(error: Exception) -> str:
+    if isinstance(error, litellm.RateLimitError):
+        return RATE_LIMITED
+    if isinstance(error, litellm.Timeout):
+        return TIMED_OUT
+    return FAILED
+
+
+def _retry_delay(stage: str, governor: EndpointGovernor, attempt: int, error: Exception) -> float:
+    governor.record_retry()
+    delay = backoff_delay(attempt, _retry_after(error))
+    logger.warning(
+        f"LLM call ({stage}) failed with {type(error).__name__}, "
+        f"retry {attempt + 1}/{LLM_MAX_RETRIES} in {delay:.1f}s"
+    )
+    return delay
+
+
+def _retry_after(error: Exception) -> float | None:
+    """Seconds from the provider's Retry-After header, if it sent one."""
+    headers = getattr(error, "litellm_response_headers", None) or getattr(
+        getattr(error, "response", None), "headers", None
+    )
+    try:
+        return float(headers.get("retry-after")) if headers else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _replay_as_stream(response: ModelResponse) -> Iterator[ModelResponseStream]:
+    message = response.choices[0].message
+    tool_calls = None
+    if message.tool_calls:
+        tool_calls = [
+            {"index": i, "id": c.id, "type": c.type,
+             "function": {"name": c.function.name, "arguments": c.function.arguments}}
+            for i, c in enumerate(message.tool_calls)
+        ]
+    yield ModelResponseStream(
+        choices=[StreamingChoices(index=0, delta=Delta(content=message.content, tool_calls=tool_calls))]
+    )
+
+
+def _record_stream(stream, key: str, messages: list) -> Iterator:
+    """Pass a stream through and store the assembled response once it is complete."""
+    chunks = []
+    for chunk in stream:
+        chunks.append(chunk)
+        yield chunk
+    _store_stream(chunks, key, messages)
+
+
+def _store_stream(chunks: list, key: str, messages: list):
+    try:
+        response = litellm.stream_chunk_builder(chunks, messages=messages)
+        if response is not None:
+            llm_cache.set(key, response.model_dump_json())
+    except Exception as e:
+        logger.warning(f"Could not cache streamed completion: {e}")
+
+
+# ******************************
+# Async variant (async engine)
+# ******************************
+async def acompletion(stage: str, **kwargs) -> Any:
+    """
+    Async counterpart of completion() on litellm.acompletion, with the same
+    response cache and token accounting. Streamed calls return an async iterator.
+    """
+    if LLM_PROMPT_CACHE_CONTROL:
+        kwargs.setdefault("cache_control_injection_points", CACHE_CONTROL_INJECTION_POINTS)
+
+    if llm_cache is None or stage not in _cached_stages:
+        return await _acall(stage, kwargs)
+
+    key = _cache_key(kwargs)
+    cached = llm_cache.get(key)
+    _count(stage, hit=cached is not None)
+
+    if cached is not None:
+        response = ModelResponse(**json.loads(cached))
+        return _areplay_as_stream(response) if kwargs.get("stream") else response
+
+    response = await _acall(stage, kwargs)
+    if kwargs.get("stream"):
+        return _arecord_stream(response, key, kwargs["messages"])
+
+    llm_cache.set(key, response.model_dump_json())
+    return response
+
+
+async def _acall(stage: str, kwargs: dict) -> Any:
+    governor = llm_governors[stage]
+    estimate = _estimate_tokens(governor, kwargs)
+    for attempt in range(LLM_MAX_RETRIES + 1):
+        reservation = await governor.aacquire(estimate)
+        try:
+            response = await litellm.acompletion(**kwargs)
+        except RETRYABLE_ERRORS as e:
+            governor.release(reservation, _outcome(e))
+            if attempt == LLM_MAX_RETRIES:
+                raise
+            await asyncio.sleep(_retry_delay(stage, governor, attempt, e))
+            continue
+        except Exception:
+            governor.release(reservation, FAILED)
+            raise
+
+        if kwargs.get("stream"):
+            return _acount_stream_usage(stage, kwargs.get("model", ""), response, governor, reservation)
+        usage = getattr(response, "usage", None)
+        record_call(stage, kwargs.get("model", ""), usage, time.monotonic() - reservation.started)
+        governor.release(reservation, OK, _total_tokens(usage))
+        return response
+
+
+async def _acount_stream_usage(
+    stage: str, model: str, stream, governor: EndpointGovernor, reservation
+) -> AsyncIterator:
+    usage = None
+    outcome = FAILED
+    try:
+        async for chunk in stream:
+            usage = getattr(chunk, "usage", None) or usage
+            yield chunk
+        outcome = OK
+    except RETRYABLE_ERRORS as e:
+        outcome = _outcome(e)
+        raise
+    finally:
+        governor.release(reservation, outcome, _total_tokens(usage))
+    record_call(stage, model, usage, time.monotonic() - reservation.started)
+
+
+async def _areplay_as_stream(response: ModelResponse) -> AsyncIterator[ModelResponseStream]:
+    for chunk in _replay_as_stream(response):
+        yield chunk
+
+
+async def _arecord_stream(stream, key: str, messages: list) -> AsyncIterator:
+    chunks = []
+    async for chunk in stream:
+        chunks.append(chunk)
+        yield chunk
+    _store_stream(chunks, key, messages)
+
+
+class StageClient:
+    """
+    Stand-in for the litellm module as `LiteLLMModel(client=...)`, so the
+    smolagents models go through `completion()` of their stage as well.
+    """
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def completion(self, **kwargs) -> Any:
+        return completion(self.stage, **kwargs)
+
+
+def cache_stats() -> dict:
+    """Per-stage hit/miss counts of the LLM response cache (this process)."""
+    with _stats_lock:
+        return {
+            stage: dict(counts) for stage, counts in _stage_stats.items()
+            if stage in _cached_stages
+        }
+
+
+def connection_stats() -> dict:
+    """Provider requests on the shared HTTP client and how many needed a new connection (this process)."""
+    with _stats_lock:
+        requests = _connection_stats["requests"]
+        new = _connection_stats["new_connections"]
+    return {"requests": requests, "new_connections": new, "reused": requests - new}
+
+
+def governor_stats() -> dict:
+    """Per-stage calls, retries, 429s and current concurrency limit of the endpoint governors (this process)."""
+    return {stage: governor.stats() for stage, governor in llm_governors.items()}
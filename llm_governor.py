@@ -0,0 +1,184 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# ******************************
+# Governor configuration
+# ******************************
+# Defaults for every endpoint; per-endpoint overrides use the endpoint's
+# env prefix, e.g. LLM_SUBAGENT_MAX_IN_FLIGHT or LLM_PLANNER_TPM_LIMIT
+LLM_MAX_IN_FLIGHT = int(os.environ.get("LLM_MAX_IN_FLIGHT", 16))
+LLM_TPM_LIMIT = int(os.environ.get("LLM_TPM_LIMIT", 0))  # tokens per minute, 0 = no limit
+
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", 5))
+LLM_BACKOFF_BASE = float(os.environ.get("LLM_BACKOFF_BASE", 1.0))  # seconds
+LLM_BACKOFF_MAX = float(os.environ.get("LLM_BACKOFF_MAX", 60.0))  # seconds
+
+# Multiplicative decrease on a 429 / a timed-out call. Slow calls alone
+# don't count: LLM latency mostly follows the length of the answer.
+RATE_LIMIT_DECREASE = 0.5
+TIMEOUT_DECREASE = 0.75
+# Several 429s within this window only halve the limit once
+DECREASE_COOLDOWN = 2.0  # seconds
+
+TPM_WINDOW = 60.0  # seconds
+ASYNC_POLL_INTERVAL = 0.05  # seconds
+
+# Pipeline stage -> env prefix of its endpoint config
+ENDPOINT_ENV_PREFIX = {
+    "planner": "LLM_PLANNER",
+    "splitter": "LLM_SUBTASKS",
+    "subagent": "LLM_SUBAGENT",
+    "synthesis": "LLM_COORDINATOR",
+}
+
+OK = "ok"
+RATE_LIMITED = "rate_limited"
+TIMED_OUT = "timed_out"
+FAILED = "failed"
+
+
+class _Reservation:
+    """Slot and token estimate held by one call."""
+    def __init__(self, tokens: int):
+        self.tokens = tokens
+        self.started = time.monotonic()
+
+
+class EndpointGovernor:
+    """
+    Process-wide admission control for one model endpoint.
+
+    - At most `limit` requests are in flight. The limit follows AIMD: it
+      grows by about one per `limit` successful calls, and shrinks
+      multiplicatively on 429s (halved) and on timeouts.
+    - Optionally, the tokens sent in the last minute stay under
+      `tokens_per_minute` (prompt estimate up front, actual usage afterwards).
+    """
+    def __init__(self, name: str, max_in_flight: int, tokens_per_minute: int = 0):
+        self.name = name
+        self.max_in_flight = max(1, max_in_flight)
+        self.tokens_per_minute = tokens_per_minute
+        self.limit = float(self.max_in_flight)
+        self.in_flight = 0
+        self.calls = 0
+        self.rate_limited = 0
+        self.timed_out = 0
+        self.retries = 0
+        self._last_decrease = 0.0
+        self._window: deque = deque()  # (timestamp, reservation) of the last TPM_WINDOW seconds
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+
+    def acquire(self, tokens: int = 0) -> _Reservation:
+        """Block until a request may be sent."""
+        with self._changed:
+            while True:
+                wait_time = self._admission_wait(tokens)
+                if wait_time == 0:
+                    return self._admit(tokens)
+                self._changed.wait(timeout=wait_time)
+
+    async def aacquire(self, tokens: int = 0) -> _Reservation:
+        """acquire() for the event loop (polls instead of blocking a thread)."""
+        while True:
+            with self._lock:
+                wait_time = self._admission_wait(tokens)
+                if wait_time == 0:
+                    return self._admit(tokens)
+            await asyncio.sleep(min(wait_time, ASYNC_POLL_INTERVAL))
+
+    def release(self, reservation: _Reservation, outcome: str, tokens_used: int | None = None):
+        """Return the slot; `outcome` is OK, RATE_LIMITED, TIMED_OUT or FAILED."""
+        with self._changed:
+            self.in_flight -= 1
+            self.calls += 1
+            if tokens_used is not None:
+                reservation.tokens = tokens_used
+
+            if outcome == RATE_LIMITED:
+                self.rate_limited += 1
+                self._decrease(RATE_LIMIT_DECREASE)
+            elif outcome == TIMED_OUT:
+                self.timed_out += 1
+                self._decrease(TIMEOUT_DECREASE)
+            elif outcome == OK:
+                self.limit = min(float(self.max_in_flight), self.limit + 1 / self.limit)
+            self._changed.notify_all()
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def _admission_wait(self, tokens: int) -> float:
+        """0 if a request with `tokens` may go now, else how long to wait (at most)."""
+        if self.in_flight >= max(1, int(self.limit)):
+            return 1.0  # woken up by release()
+
+        if self.tokens_per_minute:
+            now = time.monotonic()
+            while self._window and now - self._window[0][0] > TPM_WINDOW:
+                self._window.popleft()
+            used = sum(reservation.tokens for _, reservation in self._window)
+            # A single request larger than the budget is let through on an empty window
+            if self._window and used + tokens > self.tokens_per_minute:
+                return max(0.01, TPM_WINDOW - (now - self._window[0][0]))
+        return 0
+
+    def _admit(self, tokens: int) -> _Reservation:
+        reservation = _Reservation(tokens)
+        self.in_flight += 1
+        if self.tokens_per_minute:
+            self._window.append((time.monotonic(), reservation))
+        return reservation
+
+    def _decrease(self, factor: float):
+        now = time.monotonic()
+        if now - self._last_decrease < DECREASE_COOLDOWN:
+            return
+        self._last_decrease = now
+        old_limit = self.limit
+        self.limit = max(1.0, self.limit * factor)
+        cause = "rate limited" if factor == RATE_LIMIT_DECREASE else "timed out"
+        logger.warning(f"LLM endpoint {self.name}: {cause}, concurrency {old_limit:.1f} → {self.limit:.1f}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "retries": self.retries,
+                "rate_limited": self.rate_limited,
+                "timed_out": self.timed_out,
+                "limit": self.limit,
+                "max_in_flight": self.max_in_flight,
+            }
+
+
+def backoff_delay(attempt: int, retry_after: float | None = None) -> float:
+    """Full-jitter exponential backoff; a server's Retry-After is a lower bound."""
+    delay = random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+    if retry_after:
+        delay = max(delay, min(retry_after, LLM_BACKOFF_MAX))
+    return delay
+
+
+def _endpoint_setting(stage: str, setting: str, default: int) -> int:
+    prefix = ENDPOINT_ENV_PREFIX.get(stage)
+    value = os.environ.get(f"{prefix}_{setting}") if prefix else None
+    return int(value) if value else default
+
+
+llm_governors = {
+    stage: EndpointGovernor(
+        stage,
+        max_in_flight=_endpoint_setting(stage, "MAX_IN_FLIGHT", LLM_MAX_IN_FLIGHT),
+        tokens_per_minute=_endpoint_setting(stage, "TPM_LIMIT", LLM_TPM_LIMIT),
+    )
+    for stage in ENDPOINT_ENV_PREFIX
+}
@@ -3,7 +3,7 @@ import os
 
 from prompts import PLANNER_SYSTEM_INSTRUCTIONS
 
-from litellm import completion
+from llm import acompletion, completion
 import litellm
 
 litellm.suppress_debug_info = True
@@ -20,6 +20,7 @@ def generate_research_plan(user_query: str) -> str:
     print("API_BASE: ", LLM_PLANNER_BASE_URL)
 
     response = completion(
+        "planner",
         model=LLM_PLANNER_MODEL,
         api_base=LLM_PLANNER_BASE_URL,
         api_key=LLM_PLANNER_API_KEY,
@@ -34,6 +35,25 @@ def generate_research_plan(user_query: str) -> str:
 
     return research_plan
 
+
+async def agenerate_research_plan(user_query: str) -> str:
+    """Async counterpart of generate_research_plan (async engine)."""
+    print("Generating the research plan for the query: ", user_query)
+
+    response = await acompletion(
+        "planner",
+        model=LLM_PLANNER_MODEL,
+        api_base=LLM_PLANNER_BASE_URL,
+        api_key=LLM_PLANNER_API_KEY,
+        messages=[
+            {"role": "system", "content": PLANNER_SYSTEM_INSTRUCTIONS},
+            {"role": "user", "content": user_query},
+        ],
+        stream=False,
+    )
+
+    return response.choices[0].message.content
+
 if __name__ == "__main__":
     research_plan = generate_research_plan(user_query="What is a good pet for a 9 year old kid?")
     print(research_plan)
\ No newline at end of file
@@ -48,12 +48,12 @@ Content requirements:
 - Subtasks must collectively cover the full scope of the research plan without overlap.
 - Prefer grouping by dimensions such as time periods, regions, actors, themes, or mechanisms.
 - Do NOT include a final synthesis or integration task.
-
-If you cannot comply perfectly with these rules, return this exact JSON instead:
-{}
 """
 
-SUBAGENT_PROMPT_TEMPLATE = """
+# Subagent prompt, split for prompt (prefix) caching: the shared context is
+# identical for all subagents of a run and goes into the system prompt
+# (agent instructions), only the subtask itself is sent as the task.
+SUBAGENT_SHARED_CONTEXT_TEMPLATE = """
 You are a specialized research sub-agent.
 
 Global user query:
@@ -62,12 +62,10 @@ Global user query:
 Overall research plan:
 {research_plan}
 
-Your specific subtask (ID: {subtask_id}, Title: {subtask_title}) is:
-
-{subtask_description}
+You will be given one specific subtask of this plan.
 
 Instructions:
-- Focus ONLY on this subtask, but keep the global query in mind for context.
+- Focus ONLY on your subtask, but keep the global query in mind for context.
 - Use the available tools to search for up-to-date, high-quality sources.
 - Prioritize primary and official sources when possible.
 - Be explicit about uncertainties, disagreements in the literature, and gaps.
@@ -93,16 +91,31 @@ CRITICAL JSON FORMATTING RULES:
 - Do NOT escape brackets with backslashes (use ] not \\]).
 - Do NOT add trailing text after the JSON block.
 - Ensure all strings are properly quoted with double quotes.
+"""
+
+SUBAGENT_TASK_TEMPLATE = """
+Your specific subtask (ID: {subtask_id}, Title: {subtask_title}) is:
+
+{subtask_description}
 
 Now perform the research and return ONLY the markdown report.
 """
 
-COORDINATOR_SYNTHESIS_PROMPT_TEMPLATE = """
+# Sent when a subagent's time, step or token budget is used up
+SUBAGENT_WRAP_UP_PROMPT = (
+    "Your research budget for this subtask is used up. Do not call any more tools. "
+    "Write the final markdown report now, based on the evidence gathered so far, "
+    "and state which parts of the subtask remain open."
+)
+
+# Synthesis prompt, split for prompt (prefix) caching: the static
+# instructions are the system message, the run-specific material follows.
+COORDINATOR_SYNTHESIS_SYSTEM_PROMPT = """
 You are the LEAD RESEARCH SYNTHESIS AGENT.
 
 Your task is to produce a SINGLE, comprehensive, deeply reasoned report
 that answers the user’s original question using the research results
-provided below.
+provided to you.
 
 You are NOT coordinating tools.
 You are NOT delegating tasks.
@@ -110,24 +123,8 @@ You are NOT allowed to mention agents, tools, or internal process.
 
 You are writing the FINAL ANSWER for the user.
 
----
-
-User question:
-{user_query}
-
-Original research plan:
-{research_plan}
-
----
-
-Below are the completed research reports from multiple specialized sub-agents.
-Each report addresses a different aspect of the research plan.
-
-The reports may overlap, disagree, or emphasize different perspectives.
-Your job is to INTEGRATE them into a coherent whole.
-
-Sub-agent research reports:
-{subagent_reports}
+The user question, the original research plan and the completed research
+reports from multiple specialized sub-agents follow in the next message.
 
 ---
 
@@ -183,8 +180,50 @@ You may add subsections where helpful.
 - Do NOT mention tools, agents, prompts, or internal workflows.
 - Do NOT reference “sub-agents” or “research steps” explicitly.
 - Do NOT include JSON, code blocks (unless part of the report), or meta-commentary.
+"""
+
+COORDINATOR_SYNTHESIS_PROMPT_TEMPLATE = """
+User question:
+{user_query}
+
+Original research plan:
+{research_plan}
+
+---
+
+Below are the completed research reports from multiple specialized sub-agents.
+Each report addresses a different aspect of the research plan.
+
+The reports may overlap, disagree, or emphasize different perspectives.
+Your job is to INTEGRATE them into a coherent whole.
+
+Sub-agent research reports:
+{subagent_reports}
 
 ---
 
 Begin writing the final report now.
-"""
\ No newline at end of file
+"""
+
+
+SYNTHESIS_CONDENSE_PROMPT_TEMPLATE = """
+You are preparing research material for the final report on this question:
+{user_query}
+
+Below are several research reports (or condensed notes of earlier reports).
+Condense them into ONE set of dense research notes of at most about
+{target_words} words.
+
+Rules:
+- Keep every substantive finding, figure, date, comparison and recommendation.
+- Keep disagreements and uncertainties explicit, do not resolve them.
+- Merge points that appear in several reports instead of repeating them.
+- Keep the source links ([Title](url)) next to the findings they support,
+  and end with a deduplicated "Sources" list.
+- Keep reports marked [PARTIAL] marked as incomplete.
+- Do NOT add information that is not in the reports.
+- Output markdown notes only, no introduction or commentary.
+
+Reports:
+{reports}
+"""
@@ -0,0 +1,173 @@
+import math
+import re
+from collections import Counter
+
+# BM25 parameters (standard values)
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Weight of subtask terms relative to the search query terms
+CONTEXT_WEIGHT = 0.3
+
+CHUNK_MAX_CHARS = 1500
+CHUNK_SEPARATOR = "\n\n[...]\n\n"
+
+HEADING_PATTERN = re.compile(r"^(#{1,6})\s+(.*)$")
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "how", "i",
+    "in", "is", "it", "of", "on", "or", "that", "the", "this", "to", "was",
+    "what", "when", "where", "which", "who", "why", "will", "with", "you",
+}
+
+
+class Chunk:
+    """A piece of a markdown page together with the headings above it."""
+    def __init__(self, position: int, text: str, headings: list[str]):
+        self.position = position
+        self.text = text
+        self.headings = headings
+        self.score = 0.0
+
+    @property
+    def searchable_text(self) -> str:
+        return " ".join(self.headings + [self.text])
+
+
+def tokenize(text: str) -> list[str]:
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOPWORDS]
+
+
+def split_into_chunks(markdown: str, max_chars: int = CHUNK_MAX_CHARS) -> list[Chunk]:
+    """
+    Split markdown into heading-aware chunks.
+
+    Every heading starts a new section; sections longer than `max_chars` are
+    split further at paragraph boundaries. Each chunk remembers the heading
+    path it belongs to, so a match on a heading counts for its whole section.
+    """
+    sections: list[tuple[list[str], list[str]]] = []
+    heading_path: list[tuple[int, str]] = []
+    lines: list[str] = []
+
+    def close_section():
+        if any(line.strip() for line in lines):
+            sections.append(([h for _, h in heading_path], list(lines)))
+        lines.clear()
+
+    for line in markdown.splitlines():
+        match = HEADING_PATTERN.match(line)
+        if match:
+            close_section()
+            level = len(match.group(1))
+            heading_path = [(l, h) for l, h in heading_path if l < level]
+            heading_path.append((level, match.group(2).strip()))
+        lines.append(line)
+    close_section()
+
+    chunks: list[Chunk] = []
+    for headings, section_lines in sections:
+        section = "\n".join(section_lines).strip()
+        buffer = ""
+        for paragraph in re.split(r"\n\s*\n", section):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            # Hard-split paragraphs that are longer than a chunk on their own
+            if len(paragraph) > max_chars and buffer:
+                # Keep a pending heading/short intro together with what follows
+                paragraph = f"{buffer}\n\n{paragraph}"
+                buffer = ""
+            while len(paragraph) > max_chars:
+                cut = paragraph.rfind(" ", 0, max_chars)
+                cut = cut if cut > max_chars // 2 else max_chars
+                chunks.append(Chunk(len(chunks), paragraph[:cut].strip(), headings))
+                paragraph = paragraph[cut:].strip()
+            if buffer and len(buffer) + len(paragraph) + 2 > max_chars:
+                chunks.append(Chunk(len(chunks), buffer, headings))
+                buffer = ""
+            buffer = f"{buffer}\n\n{paragraph}" if buffer else paragraph
+        if buffer:
+            chunks.append(Chunk(len(chunks), buffer, headings))
+
+    return chunks
+
+
+def _bm25_scores(chunks: list[Chunk], query_weights: dict[str, float]) -> None:
+    docs = [Counter(tokenize(c.searchable_text)) for c in chunks]
+    lengths = [sum(d.values()) for d in docs]
+    avg_length = (sum(lengths) / len(lengths)) or 1.0
+    n = len(docs)
+
+    document_frequency = Counter()
+    for d in docs:
+        document_frequency.update(term for term in query_weights if term in d)
+
+    for chunk, d, length in zip(chunks, docs, lengths):
+        score = 0.0
+        for term, weight in query_weights.items():
+            tf = d.get(term)
+            if not tf:
+                continue
+            df = document_frequency[term]
+            # Classic BM25 idf, clamped: terms on most chunks (e.g. the page
+            # title every chunk inherits) carry no signal
+            idf = max(0.0, math.log((n - df + 0.5) / (df + 0.5)))
+            norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+            score += weight * idf * tf * (BM25_K1 + 1) / norm
+        chunk.score = score
+
+
+def select_relevant_content(markdown: str, query: str, context: str = "", budget: int = 15000) -> str:
+    """
+    Reduce a page to the chunks most relevant to `query`, within `budget` chars.
+
+    Chunks are scored with BM25 against the query terms (and, with a lower
+    weight, the `context` terms such as the subtask description). The best
+    chunks are kept and returned in their original order, gaps are marked
+    with "[...]". Left-over budget is filled with unmatched chunks from the
+    top of the page. Pages within the budget are returned unchanged.
+    """
+    if len(markdown) <= budget:
+        return markdown
+
+    chunks = split_into_chunks(markdown)
+    if not chunks:
+        return markdown[:budget]
+
+    query_weights: dict[str, float] = {}
+    for term in tokenize(context):
+        query_weights[term] = CONTEXT_WEIGHT
+    for term in tokenize(query):
+        query_weights[term] = 1.0
+
+    _bm25_scores(chunks, query_weights)
+
+    # Best first; among equal scores prefer earlier chunks (title, intro)
+    ranked = sorted(chunks, key=lambda c: (-c.score, c.position))
+
+    selected: list[Chunk] = []
+    used = 0
+    for chunk in ranked:
+        cost = len(chunk.text) + len(CHUNK_SEPARATOR)
+        if used + cost > budget:
+            if chunk.score > 0:
+                continue
+            # Unmatched chunks only pad the budget in reading order, no fragments
+            break
+        selected.append(chunk)
+        used += cost
+
+    if not selected:
+        return markdown[:budget]
+
+    selected.sort(key=lambda c: c.position)
+    parts = []
+    last_position = -1
+    for chunk in selected:
+        if parts and chunk.position != last_position + 1:
+            parts.append(CHUNK_SEPARATOR.strip())
+        parts.append(chunk.text)
+        last_position = chunk.position
+    return "\n\n".join(parts)
@@ -1,11 +1,140 @@
+import asyncio
+import codecs
+import os
 import re
-from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeout
+import time
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from playwright.sync_api import TimeoutError as PlaywrightTimeout
 from playwright.sync_api import Error as PlaywrightError
-from bs4 import BeautifulSoup
-import requests
+from bs4 import BeautifulSoup, CData, NavigableString, Tag
 
 from markdownify import markdownify as md
 
+try:
+    import lxml  # noqa: F401  (optional, faster HTML parser backend)
+    LXML_AVAILABLE = True
+except ImportError:
+    LXML_AVAILABLE = False
+
+from browser_pool import get_browser_pool, get_async_browser_pool
+from disk_cache import DiskCache
+from fetch_router import FetchRouter, STATIC, BROWSER, SKIP
+from http_session import get_session, get_async_client
+from singleflight import AsyncSingleFlight, SingleFlight
+
+SCRAPER_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+}
+
+# Streaming limits for _simple_scraper
+SCRAPER_MAX_BYTES = int(os.environ.get("SCRAPER_MAX_BYTES", 3 * 1024 * 1024))
+SCRAPER_CHUNK_SIZE = 64 * 1024
+CHARSET_SNIFF_BYTES = 2048
+META_CHARSET_PATTERN = re.compile(rb"<meta[^>]+charset=[\"']?([\w.:-]+)", re.IGNORECASE)
+
+# "html.parser" (default, pure Python) or "lxml" (faster, if installed)
+SCRAPER_HTML_PARSER = os.environ.get("SCRAPER_HTML_PARSER", "html.parser")
+if SCRAPER_HTML_PARSER == "lxml" and not LXML_AVAILABLE:
+    SCRAPER_HTML_PARSER = "html.parser"
+
+# ******************************
+# Content cache in front of fetch_url
+# ******************************
+FETCH_CACHE_ENABLED = os.environ.get("FETCH_CACHE_ENABLED", "1") == "1"
+FETCH_CACHE_TTL = float(os.environ.get("FETCH_CACHE_TTL", 24 * 3600))  # seconds
+FETCH_CACHE_MAX_BYTES = int(os.environ.get("FETCH_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+fetch_cache = (
+    DiskCache("fetch_cache", ttl=FETCH_CACHE_TTL, max_bytes=FETCH_CACHE_MAX_BYTES)
+    if FETCH_CACHE_ENABLED else None
+)
+
+# Concurrent fetches of the same URL share one request
+fetch_flight = SingleFlight("fetch_url")
+async_fetch_flight = AsyncSingleFlight("afetch_url")
+
+# ******************************
+# Learned per-domain routing (static vs. Playwright)
+# ******************************
+FETCH_ROUTER_ENABLED = os.environ.get("FETCH_ROUTER_ENABLED", "1") == "1"
+
+fetch_router = FetchRouter() if FETCH_ROUTER_ENABLED else None
+
+# Query parameters that only track the visitor and never change the content
+TRACKING_PARAMS = ("utm_", "fbclid", "gclid", "mc_cid", "mc_eid", "ref_src")
+
+
+# Tags that disqualify a text-dense candidate when nested inside it
+NON_CONTENT_TAGS = {"nav", "aside", "footer", "header"}
+HEADING_TAGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+
+# Same string types Tag.get_text() collects by default (no comments, scripts, ...)
+TEXT_STRING_TYPES = (NavigableString, CData)
+
+
+def _best_text_dense_div(soup: BeautifulSoup) -> Tag | None:
+    """
+    Pick the <div> with the best article-like score.
+
+    Scores every div by its descendant counts:
+        paragraphs * 3 + headings * 5 + list_items - links * 2
+    skipping divs with less than 200 chars of text or with nested nav/aside/
+    footer/header. Ties go to the first div in document order.
+
+    All counts are aggregated bottom-up in a single pass over the tree, so
+    this is linear in DOM size instead of running find_all/get_text per div.
+    """
+    tags = soup.find_all(True)  # document order, parents before children
+
+    # id(tag) -> [paragraphs, headings, list_items, links, text_length, has_non_content]
+    # (counted over descendants only, like find_all)
+    stats: dict[int, list] = {}
+    for tag in reversed(tags):  # children are always done before their parent
+        agg = [0, 0, 0, 0, 0, False]
+        for child in tag.contents:
+            if isinstance(child, Tag):
+                c = stats[id(child)]
+                agg[0] += c[0] + (child.name == "p")
+                agg[1] += c[1] + (child.name in HEADING_TAGS)
+                agg[2] += c[2] + (child.name == "li")
+                agg[3] += c[3] + (child.name == "a")
+                agg[4] += c[4]
+                agg[5] = agg[5] or c[5] or child.name in NON_CONTENT_TAGS
+            elif type(child) in TEXT_STRING_TYPES:
+                agg[4] += len(child.strip())
+        stats[id(tag)] = agg
+
+    best_candidate = None
+    best_score = 0
+
+    for tag in tags:
+        if tag.name != "div":
+            continue
+
+        paragraphs, headings, list_items, links, text_length, has_non_content = stats[id(tag)]
+
+        # Skip obvious non-content containers
+        if has_non_content:
+            continue
+
+        if text_length < 200:
+            continue
+
+        score = (
+            paragraphs * 3
+            + headings * 5
+            + list_items
+            - links * 2
+        )
+
+        if score > best_score:
+            best_score = score
+            best_candidate = tag
+
+    return best_candidate
+
+
 def _select_main_content(soup: BeautifulSoup):
     # 1. Strong semantic signals
     for candidate in (
@@ -40,34 +169,7 @@ def _select_main_content(soup: BeautifulSoup):
         return hinted
 
     # 3. Text-dense fallback (article-like scoring)
-    best_candidate = None
-    best_score = 0
-
-    for tag in soup.find_all("div"):
-        # Skip obvious non-content containers
-        if tag.find(["nav", "aside", "footer", "header"]):
-            continue
-
-        paragraphs = len(tag.find_all("p"))
-        headings = len(tag.find_all(["h1", "h2", "h3", "h4", "h5", "h6"]))
-        list_items = len(tag.find_all("li"))
-        links = len(tag.find_all("a"))
-
-        text_length = len(tag.get_text(strip=True))
-        if text_length < 200:
-            continue
-
-        score = (
-            paragraphs * 3
-            + headings * 5
-            + list_items
-            - links * 2
-        )
-
-        if score > best_score:
-            best_score = score
-            best_candidate = tag
-
+    best_candidate = _best_text_dense_div(soup)
     if best_candidate:
         return best_candidate
 
@@ -113,7 +215,7 @@ def _create_markdown(main_content, soup: BeautifulSoup) -> str | None:
 
 def _process_html(html: str, text_only: bool):
     """Parse and extract content from HTML."""
-    soup = BeautifulSoup(html, 'html.parser')
+    soup = BeautifulSoup(html, SCRAPER_HTML_PARSER)
 
     if not text_only:
         if soup.body:
@@ -128,6 +230,27 @@ def _process_html(html: str, text_only: bool):
     return _create_markdown(main_content, soup)
 
 
+def normalize_url(url: str) -> str:
+    """
+    Canonical form of a URL for use as a cache key.
+
+    Lowercases scheme and host, drops default ports, fragments and tracking
+    parameters, and sorts the remaining query parameters.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and (scheme, parts.port) not in (("http", 80), ("https", 443)):
+        host = f"{host}:{parts.port}"
+
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith(TRACKING_PARAMS)
+    )
+    path = parts.path or "/"
+    return urlunsplit((scheme, host, path, urlencode(query), ""))
+
+
 def is_likely_download_url(url: str) -> bool:
     """Check if URL is likely to trigger a download."""
     download_extensions = ['.pdf', '.doc', '.docx', '.xls', '.xlsx', '.zip', '.tar', '.gz']
@@ -135,28 +258,84 @@ def is_likely_download_url(url: str) -> bool:
     return any(url_lower.endswith(ext) or f"{ext}?" in url_lower for ext in download_extensions)
 
 
+def _charset_from_content_type(content_type: str) -> str | None:
+    match = re.search(r"charset=[\"']?([\w.:-]+)", content_type, flags=re.IGNORECASE)
+    return match.group(1) if match else None
+
+
+def _detect_charset(content_type: str, head: bytes) -> str:
+    """Charset from the Content-Type header, else a <meta> tag, else UTF-8."""
+    charset = _charset_from_content_type(content_type)
+    if not charset:
+        match = META_CHARSET_PATTERN.search(head)
+        charset = match.group(1).decode("ascii", errors="ignore") if match else None
+    try:
+        return codecs.lookup(charset).name if charset else "utf-8"
+    except LookupError:
+        return "utf-8"
+
+
+def _read_html(resp, content_type: str, max_bytes: int) -> str:
+    """
+    Read and decode a streamed response body, at most `max_bytes`.
+
+    Larger pages are cut off at the cap; the parser copes with truncated
+    HTML and the main content is usually near the top anyway.
+    """
+    decoder = None
+    head = b""
+    parts = []
+    received = 0
+
+    for chunk in resp.iter_content(chunk_size=SCRAPER_CHUNK_SIZE):
+        if not chunk:
+            continue
+        chunk = chunk[:max_bytes - received]
+        received += len(chunk)
+
+        if decoder is None:
+            # Buffer the first bytes until we can sniff a <meta charset>
+            head += chunk
+            if len(head) < CHARSET_SNIFF_BYTES and received < max_bytes:
+                continue
+            decoder = codecs.getincrementaldecoder(_detect_charset(content_type, head))(errors="replace")
+            chunk, head = head, b""
+
+        parts.append(decoder.decode(chunk))
+        if received >= max_bytes:
+            break
+
+    if decoder is None:
+        decoder = codecs.getincrementaldecoder(_detect_charset(content_type, head))(errors="replace")
+        parts.append(decoder.decode(head))
+    parts.append(decoder.decode(b"", final=True))
+
+    return "".join(parts)
+
+
 def _simple_scraper(url: str, text_only: bool = True, timeout: int = 10) -> str | None:
     """Fast HTTP-based scraper for static sites."""
     if is_likely_download_url(url):
         return None  # Skip downloads
     
     try:
-        resp = requests.get(
+        # stream=True: only headers are read here, the body is pulled below
+        with get_session("scraper", headers=SCRAPER_HEADERS).get(
             url, 
             timeout=timeout, 
-            headers={
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-            },
-            allow_redirects=True
-        )
-        resp.raise_for_status()
-        
-        # Check content type - skip non-HTML
-        content_type = resp.headers.get('Content-Type', '')
-        if 'text/html' not in content_type and 'application/xhtml' not in content_type:
-            return None
+            allow_redirects=True,
+            stream=True,
+        ) as resp:
+            resp.raise_for_status()
+            
+            # Check content type - skip non-HTML before downloading the body
+            content_type = resp.headers.get('Content-Type', '')
+            if 'text/html' not in content_type and 'application/xhtml' not in content_type:
+                return None
+            
+            html = _read_html(resp, content_type, max_bytes=SCRAPER_MAX_BYTES)
         
-        return _process_html(html=resp.text, text_only=text_only)
+        return _process_html(html=html, text_only=text_only)
     except Exception:
         return None
 
@@ -171,60 +350,36 @@ def _scrape_with_playwright(
     Scrape using Playwright for JavaScript-rendered sites.
     
     Uses domcontentloaded instead of networkidle for reliability.
+    Pages are rendered in the shared, warm browser pool (see browser_pool.py)
+    instead of launching a new Chromium per URL.
     """
     if is_likely_download_url(url):
         return None
+
+    def render(page) -> str | None:
+        # Navigate with explicit timeout and domcontentloaded (more reliable)
+        response = page.goto(
+            url, 
+            wait_until="domcontentloaded",  # Changed from networkidle
+            timeout=timeout
+        )
+        
+        # Check if we got a valid response
+        if response and response.status >= 400:
+            return None
+        
+        # Brief wait for JS to execute
+        page.wait_for_timeout(wait_after_load)
+        
+        return page.content()
     
-    browser = None
     try:
-        with sync_playwright() as p:
-            # Launch with minimal resource usage
-            browser = p.chromium.launch(
-                headless=True,
-                args=[
-                    '--disable-gpu',
-                    '--disable-dev-shm-usage',
-                    '--no-sandbox',
-                    '--disable-setuid-sandbox',
-                    '--disable-extensions',
-                ]
-            )
-            
-            context = browser.new_context(
-                # Block unnecessary resources for faster loading
-                java_script_enabled=True,
-                ignore_https_errors=True,
-            )
-            
-            page = context.new_page()
-            
-            # Block downloads
-            page.on("download", lambda download: download.cancel())
-            
-            # Block heavy resources to speed up loading
-            page.route("**/*.{png,jpg,jpeg,gif,svg,ico,woff,woff2,ttf}", 
-                      lambda route: route.abort())
-            
-            # Navigate with explicit timeout and domcontentloaded (more reliable)
-            response = page.goto(
-                url, 
-                wait_until="domcontentloaded",  # Changed from networkidle
-                timeout=timeout
-            )
-            
-            # Check if we got a valid response
-            if response and response.status >= 400:
-                return None
-            
-            # Brief wait for JS to execute
-            page.wait_for_timeout(wait_after_load)
-            
-            html = page.content()
-            
-            context.close()
-            browser.close()
-            
-            return _process_html(html=html, text_only=text_only)
+        # Allow some slack on top of the page timeout for queueing on the worker
+        html = get_browser_pool().run(render, timeout=(timeout + wait_after_load) / 1000 + 5)
+        if not html:
+            return None
+        
+        return _process_html(html=html, text_only=text_only)
             
     except PlaywrightTimeout:
         return None
@@ -236,32 +391,165 @@ def _scrape_with_playwright(
         return None
     except Exception:
         return None
-    finally:
-        if browser:
-            try:
-                browser.close()
-            except Exception:
-                pass
 
 
 def fetch_url(url: str, text_only: bool = True) -> str | None:
     """
     Smart fetch: try simple scraper first, fall back to Playwright.
     
-    This is the main entry point for fetching content.
+    This is the main entry point for fetching content. Extracted content
+    is cached on disk, keyed on the normalized URL and `text_only`, and
+    concurrent calls for the same key are coalesced into one fetch.
     """
     # Skip obvious downloads
     if is_likely_download_url(url):
         return None
-    
-    # Try fast path first
-    content = _simple_scraper(url, text_only=text_only)
-    
-    if content and len(content) > 200:  # Got meaningful content
-        return content
+
+    key = (normalize_url(url), text_only)
+    if fetch_cache is not None:
+        cached = fetch_cache.get(DiskCache.make_key(*key))
+        if cached is not None:
+            return cached
+
+    # The same page requested by another thread right now: wait for that fetch
+    return fetch_flight.do(key, _fetch_and_store, url, key, text_only)
+
+
+def _fetch_and_store(url: str, key: tuple, text_only: bool) -> str | None:
+    content = _fetch_uncached(url, text_only=text_only)
+
+    if content and fetch_cache is not None:
+        fetch_cache.set(DiskCache.make_key(*key), content)
+
+    return content
+
+
+def _fetch_uncached(url: str, text_only: bool = True) -> str | None:
+    domain = urlsplit(url).hostname or ""
+    strategy = fetch_router.choose(domain) if fetch_router is not None else STATIC
+
+    # Both strategies keep failing on this domain, don't waste time on it
+    if strategy == SKIP:
+        return None
+
+    # Try fast path first, unless the domain is known to need JS rendering
+    if strategy == STATIC:
+        start = time.monotonic()
+        content = _simple_scraper(url, text_only=text_only)
+        got_content = bool(content) and len(content) > 200  # Got meaningful content
+        _record_route(domain, STATIC, got_content, start)
+        
+        if got_content:
+            return content
     
     # Fall back to Playwright for JS-rendered sites
-    return _scrape_with_playwright(url, text_only=text_only)
+    start = time.monotonic()
+    content = _scrape_with_playwright(url, text_only=text_only)
+    _record_route(domain, BROWSER, bool(content), start)
+    return content
+
+
+def _record_route(domain: str, strategy: str, success: bool, start: float):
+    if fetch_router is not None and domain:
+        fetch_router.record(domain, strategy, success, time.monotonic() - start)
+
+
+# ******************************
+# Async variants (async engine)
+# ******************************
+async def afetch_url(url: str, text_only: bool = True) -> str | None:
+    """
+    Async counterpart of fetch_url(): same cache, routing and coalescing,
+    with httpx for static pages and Playwright's async API for rendering.
+    HTML parsing runs in a worker thread to keep the event loop free.
+    """
+    if is_likely_download_url(url):
+        return None
+
+    key = (normalize_url(url), text_only)
+    if fetch_cache is not None:
+        cached = fetch_cache.get(DiskCache.make_key(*key))
+        if cached is not None:
+            return cached
+
+    return await async_fetch_flight.do(key, _afetch_and_store, url, key, text_only)
+
+
+async def _afetch_and_store(url: str, key: tuple, text_only: bool) -> str | None:
+    content = await _afetch_uncached(url, text_only=text_only)
+
+    if content and fetch_cache is not None:
+        fetch_cache.set(DiskCache.make_key(*key), content)
+
+    return content
+
+
+async def _afetch_uncached(url: str, text_only: bool = True) -> str | None:
+    domain = urlsplit(url).hostname or ""
+    strategy = fetch_router.choose(domain) if fetch_router is not None else STATIC
+
+    if strategy == SKIP:
+        return None
+
+    if strategy == STATIC:
+        start = time.monotonic()
+        content = await _asimple_scraper(url, text_only=text_only)
+        got_content = bool(content) and len(content) > 200
+        _record_route(domain, STATIC, got_content, start)
+
+        if got_content:
+            return content
+
+    start = time.monotonic()
+    content = await _ascrape_with_playwright(url, text_only=text_only)
+    _record_route(domain, BROWSER, bool(content), start)
+    return content
+
+
+async def _asimple_scraper(url: str, text_only: bool = True, timeout: int = 10) -> str | None:
+    try:
+        client = get_async_client("scraper", headers=SCRAPER_HEADERS)
+        async with client.stream("GET", url, timeout=timeout) as resp:
+            resp.raise_for_status()
+
+            content_type = resp.headers.get('Content-Type', '')
+            if 'text/html' not in content_type and 'application/xhtml' not in content_type:
+                return None
+
+            body = bytearray()
+            async for chunk in resp.aiter_bytes(SCRAPER_CHUNK_SIZE):
+                body += chunk[:SCRAPER_MAX_BYTES - len(body)]
+                if len(body) >= SCRAPER_MAX_BYTES:
+                    break
+
+        charset = _detect_charset(content_type, bytes(body[:CHARSET_SNIFF_BYTES]))
+        html = body.decode(charset, errors="replace")
+        return await asyncio.to_thread(_process_html, html, text_only)
+    except Exception:
+        return None
+
+
+async def _ascrape_with_playwright(
+    url: str,
+    text_only: bool = True,
+    timeout: int = 15000,  # 15 seconds
+    wait_after_load: int = 1000  # 1 second
+) -> str | None:
+    async def render(page) -> str | None:
+        response = await page.goto(url, wait_until="domcontentloaded", timeout=timeout)
+        if response and response.status >= 400:
+            return None
+        await page.wait_for_timeout(wait_after_load)
+        return await page.content()
+
+    try:
+        html = await get_async_browser_pool().run(render, timeout=(timeout + wait_after_load) / 1000 + 5)
+        if not html:
+            return None
+
+        return await asyncio.to_thread(_process_html, html, text_only)
+    except Exception:
+        return None
 
 
 if __name__ == "__main__":
@@ -1,7 +1,17 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import json
 import logging
 import os
-import requests
+import threading
+import time
 from ddgs import DDGS
+from ddgs.exceptions import RatelimitException
+
+from disk_cache import DiskCache
+from http_session import get_session, get_async_client
+from scraper import normalize_url
+from singleflight import AsyncSingleFlight, SingleFlight
 
 logger = logging.getLogger(__name__)
 
@@ -9,6 +19,192 @@ GOOGLE_API_KEY = os.environ["GOOGLE_API_KEY"]
 GOOGLE_CX = os.environ["GOOGLE_CX"]
 GOOGLE_SEARCH_URL = os.environ["GOOGLE_SEARCH_URL"]
 
+# Concurrent identical searches share one request
+search_flight = SingleFlight("search_with_fallback")
+async_search_flight = AsyncSingleFlight("asearch_with_fallback")
+
+# ******************************
+# Backend selection
+# ******************************
+SEARCH_MODES = ("fallback", "hedged", "merge")
+SEARCH_MODE = os.environ.get("SEARCH_MODE", "fallback")
+SEARCH_HEDGE_DELAY = float(os.environ.get("SEARCH_HEDGE_DELAY", 1.0))  # seconds, 0 = fire both at once
+
+BACKEND_PRIORITY = {"google": 0, "duckduckgo": 1}
+
+# Backends run here in hedged/merge mode, so a slow loser never blocks the caller
+_backend_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="search-backend")
+
+_backend_latency: dict[str, dict] = {}
+_latency_lock = threading.Lock()
+
+# ******************************
+# Rate limits, quotas and circuit breaking
+# ******************************
+GOOGLE_RATE_PER_MINUTE = float(os.environ.get("GOOGLE_RATE_PER_MINUTE", 60))
+GOOGLE_BURST = int(os.environ.get("GOOGLE_BURST", 10))
+DDG_RATE_PER_MINUTE = float(os.environ.get("DDG_RATE_PER_MINUTE", 20))
+DDG_BURST = int(os.environ.get("DDG_BURST", 5))
+
+SEARCH_MAX_QUEUE_WAIT = float(os.environ.get("SEARCH_MAX_QUEUE_WAIT", 5))  # seconds
+SEARCH_RATE_LIMIT_COOLDOWN = float(os.environ.get("SEARCH_RATE_LIMIT_COOLDOWN", 60))  # seconds
+SEARCH_QUOTA_COOLDOWN = float(os.environ.get("SEARCH_QUOTA_COOLDOWN", 3600))  # seconds
+SEARCH_MAX_COOLDOWN = float(os.environ.get("SEARCH_MAX_COOLDOWN", 6 * 3600))  # seconds
+
+RATE_LIMITED = "rate_limit"
+QUOTA_EXHAUSTED = "quota"
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, at most `capacity` stored."""
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, max_wait: float) -> float | None:
+        """
+        Take a token. Returns how long the caller must wait before using it,
+        or None (nothing taken) if that would be longer than `max_wait`.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+            wait_time = max(0.0, (1 - self._tokens) / self.rate)
+            if wait_time > max_wait:
+                return None
+            # May go negative: later callers queue up behind this reservation
+            self._tokens -= 1
+            return wait_time
+
+
+class BackendScheduler:
+    """
+    Process-wide admission control for one search backend.
+
+    - A token bucket keeps us under the backend's request rate; callers wait
+      for a token when the wait is short and are turned away otherwise.
+    - On 429s or exhausted quotas the circuit opens: all calls are refused
+      for a cooldown, so traffic goes to the other backend. Cooldowns double
+      for repeated trips (capped) and reset after the next success.
+    """
+    def __init__(self, name: str, rate_per_minute: float, burst: int):
+        self.name = name
+        self.bucket = TokenBucket(rate=rate_per_minute / 60, capacity=burst)
+        self.admitted = 0
+        self.rejected = 0
+        self.trips = 0
+        self._open_until = 0.0
+        self._consecutive_trips = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, max_wait: float = SEARCH_MAX_QUEUE_WAIT) -> bool:
+        """Wait for permission to send one request; False if not possible within `max_wait`."""
+        delay = self._admit(max_wait)
+        if delay is None:
+            return False
+        if delay > 0:
+            time.sleep(delay)
+        return True
+
+    async def aacquire(self, max_wait: float = SEARCH_MAX_QUEUE_WAIT) -> bool:
+        """acquire() for the event loop: waits with asyncio.sleep."""
+        delay = self._admit(max_wait)
+        if delay is None:
+            return False
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return True
+
+    def _admit(self, max_wait: float) -> float | None:
+        """Delay before the request may be sent, or None if it is turned away."""
+        with self._lock:
+            circuit_wait = max(0.0, self._open_until - time.time())
+        if circuit_wait > max_wait:
+            return self._reject()
+
+        token_wait = self.bucket.reserve(max_wait - circuit_wait)
+        if token_wait is None:
+            return self._reject()
+
+        with self._lock:
+            self.admitted += 1
+        return max(circuit_wait, token_wait)
+
+    def _reject(self) -> None:
+        with self._lock:
+            self.rejected += 1
+        return None
+
+    def trip(self, reason: str, retry_after: float | None = None):
+        with self._lock:
+            base = SEARCH_QUOTA_COOLDOWN if reason == QUOTA_EXHAUSTED else SEARCH_RATE_LIMIT_COOLDOWN
+            cooldown = min(SEARCH_MAX_COOLDOWN, base * 2 ** self._consecutive_trips)
+            if retry_after:
+                cooldown = max(cooldown, retry_after)
+            self._consecutive_trips += 1
+            self.trips += 1
+            self._open_until = max(self._open_until, time.time() + cooldown)
+        logger.warning(f"Search backend {self.name}: {reason}, pausing for {cooldown:.0f}s")
+
+    def report_success(self):
+        with self._lock:
+            self._consecutive_trips = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "trips": self.trips,
+                "open_for": max(0.0, self._open_until - time.time()),
+            }
+
+
+search_schedulers = {
+    "google": BackendScheduler("google", GOOGLE_RATE_PER_MINUTE, GOOGLE_BURST),
+    "duckduckgo": BackendScheduler("duckduckgo", DDG_RATE_PER_MINUTE, DDG_BURST),
+}
+
+# ******************************
+# Search result cache
+# ******************************
+SEARCH_CACHE_ENABLED = os.environ.get("SEARCH_CACHE_ENABLED", "1") == "1"
+SEARCH_CACHE_TTL = float(os.environ.get("SEARCH_CACHE_TTL", 12 * 3600))  # seconds
+SEARCH_CACHE_MAX_BYTES = int(os.environ.get("SEARCH_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+
+search_cache = (
+    DiskCache("search_cache", ttl=SEARCH_CACHE_TTL, max_bytes=SEARCH_CACHE_MAX_BYTES)
+    if SEARCH_CACHE_ENABLED else None
+)
+
+
+def _classify_google_error(resp) -> str | None:
+    """Tell rate limiting and exhausted (daily) quota apart from other errors."""
+    if resp.status_code not in (403, 429):
+        return None
+    try:
+        error_text = json.dumps(resp.json().get("error", {})).lower()
+    except ValueError:
+        error_text = ""
+
+    if "per day" in error_text or "dailylimitexceeded" in error_text:
+        return QUOTA_EXHAUSTED
+    if resp.status_code == 429 or "ratelimitexceeded" in error_text or "quota" in error_text:
+        return RATE_LIMITED
+    return None
+
+
+def _retry_after(resp) -> float | None:
+    try:
+        return float(resp.headers.get("Retry-After", ""))
+    except ValueError:
+        return None
+
 
 def _google_search(query: str, num_results: int = 10) -> list[dict]:
     """Internal Google search implementation."""
@@ -18,8 +214,16 @@ def _google_search(query: str, num_results: int = 10) -> list[dict]:
         "q": query,
         "num": num_results,
     }
+    scheduler = search_schedulers["google"]
     try:
-        resp = requests.get(GOOGLE_SEARCH_URL, params=params, timeout=10)
+        resp = get_session("search").get(GOOGLE_SEARCH_URL, params=params, timeout=10)
+        
+        # Rate limit or quota: route traffic away from Google for a while
+        limit = _classify_google_error(resp)
+        if limit:
+            scheduler.trip(limit, retry_after=_retry_after(resp))
+            return []
+        
         resp.raise_for_status()
         data = resp.json()
         
@@ -32,6 +236,11 @@ def _google_search(query: str, num_results: int = 10) -> list[dict]:
         logger.warning(f"Google search failed for '{query}': {e}")
         return []
 
+    scheduler.report_success()
+    return _google_results(data)
+
+
+def _google_results(data: dict) -> list[dict]:
     return [
         {
             "title": item.get("title"),
@@ -47,6 +256,7 @@ def _duckduckgo_search(query: str, num_results: int = 10) -> list[dict]:
     try:
         # DDGS().text() returns a list directly, not a dict
         results = DDGS().text(query, max_results=num_results)
+        search_schedulers["duckduckgo"].report_success()
         
         return [
             {
@@ -56,27 +266,322 @@ def _duckduckgo_search(query: str, num_results: int = 10) -> list[dict]:
             }
             for item in results
         ]
+    except RatelimitException as e:
+        search_schedulers["duckduckgo"].trip(RATE_LIMITED)
+        logger.warning(f"DuckDuckGo rate limited for '{query}': {e}")
+        return []
     except Exception as e:
         logger.warning(f"DuckDuckGo search failed for '{query}': {e}")
         return []
 
 
-def search_with_fallback(query: str, num_results: int = 10) -> tuple[list[dict], str]:
+def normalize_query(query: str) -> str:
+    """
+    Lowercase, drop surrounding punctuation and sort the words, so queries
+    that only differ in case, whitespace or word order match.
+    """
+    words = (word.strip(".,;:!?\"'()") for word in query.lower().split())
+    return " ".join(sorted(word for word in words if word))
+
+
+def search_with_fallback(
+    query: str,
+    num_results: int = 10,
+    mode: str | None = None
+) -> tuple[list[dict], str]:
     """
     Search with Google first, fall back to DuckDuckGo if needed.
     
+    `mode` (default: SEARCH_MODE) selects how the backends are combined:
+    - "fallback": Google, then DuckDuckGo only if Google returned nothing
+    - "hedged": Google, plus DuckDuckGo in parallel after SEARCH_HEDGE_DELAY
+      seconds (0 = right away); the first non-empty result set wins
+    - "merge": both in parallel, results interleaved and deduplicated by URL
+    
+    Results are cached on disk, keyed on the normalized query and
+    `num_results`. Identical searches already in flight (e.g. from a
+    parallel subagent) are shared instead of being sent again.
+    
     Returns:
-        Tuple of (results, source) where source is 'google' or 'duckduckgo'
+        Tuple of (results, source) where source is 'google', 'duckduckgo'
+        or 'google+duckduckgo' (merge mode)
     """
+    mode = mode or SEARCH_MODE
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode '{mode}', expected one of {SEARCH_MODES}")
+
+    # Merged result sets differ from single-backend ones, keep them apart
+    key = (normalize_query(query), num_results, mode == "merge")
+
+    if search_cache is not None:
+        cached, source = search_cache.get_with_meta(DiskCache.make_key(*key))
+        if cached is not None:
+            return json.loads(cached), source
+
+    results, source = search_flight.do(key, _search_and_store, query, num_results, mode, key)
+    # Callers share the result, hand out copies so nobody mutates another's list
+    return [dict(item) for item in results], source
+
+
+def _search_and_store(query: str, num_results: int, mode: str, key: tuple) -> tuple[list[dict], str]:
+    if mode == "hedged":
+        results, source = _hedged_search(query, num_results, delay=SEARCH_HEDGE_DELAY)
+    elif mode == "merge":
+        results, source = _merged_search(query, num_results)
+    else:
+        results, source = _search_with_fallback(query, num_results)
+
+    # The backend is stored with the entry, so cached results keep their source tag
+    if results and search_cache is not None:
+        search_cache.set(DiskCache.make_key(*key), json.dumps(results), meta=source)
+
+    return results, source
+
+
+def _search_with_fallback(query: str, num_results: int = 10) -> tuple[list[dict], str]:
     # Try Google first
-    results = _google_search(query, num_results)
+    results = _run_backend("google", query, num_results)
     if results:
         return results, "google"
     
     # Fall back to DuckDuckGo
     print(f"    ⚠️  Google returned no results, trying DuckDuckGo...")
-    results = _duckduckgo_search(query, num_results)
+    results = _run_backend("duckduckgo", query, num_results)
     if results:
         return results, "duckduckgo"
     
     return [], "none"
+
+
+def _hedged_search(query: str, num_results: int, delay: float) -> tuple[list[dict], str]:
+    """Race Google against a (possibly delayed) DuckDuckGo request."""
+    pending = {_backend_executor.submit(_run_backend, "google", query, num_results): "google"}
+
+    if delay > 0:
+        done, _ = wait(pending, timeout=delay)
+        for future in done:
+            results = future.result()
+            if results:
+                return results, "google"
+            del pending[future]
+
+    pending[_backend_executor.submit(_run_backend, "duckduckgo", query, num_results)] = "duckduckgo"
+
+    while pending:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        # Prefer Google when both finished at once
+        for future in sorted(done, key=lambda f: BACKEND_PRIORITY[pending[f]]):
+            backend = pending.pop(future)
+            results = future.result()
+            if results:
+                return results, backend
+
+    return [], "none"
+
+
+def _merged_search(query: str, num_results: int) -> tuple[list[dict], str]:
+    """Query both backends in parallel, interleave and deduplicate by URL."""
+    futures = {
+        backend: _backend_executor.submit(_run_backend, backend, query, num_results)
+        for backend in BACKEND_PRIORITY
+    }
+    result_sets = {backend: future.result() for backend, future in futures.items()}
+    return _merge_result_sets(result_sets, num_results)
+
+
+def _merge_result_sets(result_sets: dict[str, list[dict]], num_results: int) -> tuple[list[dict], str]:
+    """Interleave the backends' results by rank, deduplicated by normalized URL."""
+    sources = [backend for backend, results in result_sets.items() if results]
+    if not sources:
+        return [], "none"
+
+    merged = []
+    seen_urls = set()
+    for rank in range(num_results):
+        for backend in sources:
+            results = result_sets[backend]
+            if rank >= len(results):
+                continue
+            url = results[rank].get("url")
+            if not url:
+                continue
+            key = normalize_url(url)
+            if key in seen_urls:
+                continue
+            seen_urls.add(key)
+            merged.append(results[rank])
+
+    return merged[:num_results], "+".join(sources)
+
+
+def _run_backend(backend: str, query: str, num_results: int) -> list[dict]:
+    """Run one search backend and record its latency."""
+    # Turned away (circuit open or no token in time) counts as no results,
+    # so the caller moves on to the other backend
+    if not search_schedulers[backend].acquire():
+        return []
+
+    start = time.monotonic()
+    try:
+        if backend == "google":
+            return _google_search(query, num_results)
+        return _duckduckgo_search(query, num_results)
+    finally:
+        _record_latency(backend, time.monotonic() - start)
+
+
+def _record_latency(backend: str, seconds: float):
+    with _latency_lock:
+        stats = _backend_latency.setdefault(backend, {"calls": 0, "total": 0.0, "max": 0.0})
+        stats["calls"] += 1
+        stats["total"] += seconds
+        stats["max"] = max(stats["max"], seconds)
+
+
+def backend_latency_stats() -> dict:
+    """Per-backend call count, average and max latency (seconds) of this process."""
+    with _latency_lock:
+        return {
+            backend: {
+                "calls": stats["calls"],
+                "avg": stats["total"] / stats["calls"] if stats["calls"] else 0.0,
+                "max": stats["max"],
+            }
+            for backend, stats in _backend_latency.items()
+        }
+
+
+# ******************************
+# Async variants (async engine)
+# ******************************
+# Strong references to loser tasks of hedged searches, which finish on their own
+_background_tasks: set[asyncio.Task] = set()
+
+
+async def asearch_with_fallback(
+    query: str,
+    num_results: int = 10,
+    mode: str | None = None
+) -> tuple[list[dict], str]:
+    """
+    Async counterpart of search_with_fallback(): same modes, cache, rate
+    limits and coalescing. Google goes through httpx; the DuckDuckGo client
+    is synchronous and runs in a worker thread.
+    """
+    mode = mode or SEARCH_MODE
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode '{mode}', expected one of {SEARCH_MODES}")
+
+    key = (normalize_query(query), num_results, mode == "merge")
+
+    if search_cache is not None:
+        cached, source = search_cache.get_with_meta(DiskCache.make_key(*key))
+        if cached is not None:
+            return json.loads(cached), source
+
+    results, source = await async_search_flight.do(key, _asearch_and_store, query, num_results, mode, key)
+    return [dict(item) for item in results], source
+
+
+async def _asearch_and_store(query: str, num_results: int, mode: str, key: tuple) -> tuple[list[dict], str]:
+    if mode == "hedged":
+        results, source = await _ahedged_search(query, num_results, delay=SEARCH_HEDGE_DELAY)
+    elif mode == "merge":
+        result_sets = await asyncio.gather(
+            *(_arun_backend(backend, query, num_results) for backend in BACKEND_PRIORITY)
+        )
+        results, source = _merge_result_sets(dict(zip(BACKEND_PRIORITY, result_sets)), num_results)
+    else:
+        results, source = await _asearch_with_fallback(query, num_results)
+
+    if results and search_cache is not None:
+        search_cache.set(DiskCache.make_key(*key), json.dumps(results), meta=source)
+
+    return results, source
+
+
+async def _asearch_with_fallback(query: str, num_results: int) -> tuple[list[dict], str]:
+    results = await _arun_backend("google", query, num_results)
+    if results:
+        return results, "google"
+
+    print(f"    ⚠️  Google returned no results, trying DuckDuckGo...")
+    results = await _arun_backend("duckduckgo", query, num_results)
+    if results:
+        return results, "duckduckgo"
+
+    return [], "none"
+
+
+async def _ahedged_search(query: str, num_results: int, delay: float) -> tuple[list[dict], str]:
+    pending = {asyncio.ensure_future(_arun_backend("google", query, num_results)): "google"}
+
+    if delay > 0:
+        done, _ = await asyncio.wait(pending, timeout=delay)
+        for task in done:
+            results = task.result()
+            if results:
+                return results, "google"
+            del pending[task]
+
+    pending[asyncio.ensure_future(_arun_backend("duckduckgo", query, num_results))] = "duckduckgo"
+
+    try:
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in sorted(done, key=lambda t: BACKEND_PRIORITY[pending[t]]):
+                backend = pending.pop(task)
+                results = task.result()
+                if results:
+                    return results, backend
+    finally:
+        # Let the slower backend finish (it still records its latency)
+        for task in pending:
+            _background_tasks.add(task)
+            task.add_done_callback(_background_tasks.discard)
+
+    return [], "none"
+
+
+async def _arun_backend(backend: str, query: str, num_results: int) -> list[dict]:
+    if not await search_schedulers[backend].aacquire():
+        return []
+
+    start = time.monotonic()
+    try:
+        if backend == "google":
+            return await _agoogle_search(query, num_results)
+        return await asyncio.to_thread(_duckduckgo_search, query, num_results)
+    finally:
+        _record_latency(backend, time.monotonic() - start)
+
+
+async def _agoogle_search(query: str, num_results: int = 10) -> list[dict]:
+    params = {
+        "key": GOOGLE_API_KEY,
+        "cx": GOOGLE_CX,
+        "q": query,
+        "num": num_results,
+    }
+    scheduler = search_schedulers["google"]
+    try:
+        resp = await get_async_client("search").get(GOOGLE_SEARCH_URL, params=params, timeout=10)
+
+        limit = _classify_google_error(resp)
+        if limit:
+            scheduler.trip(limit, retry_after=_retry_after(resp))
+            return []
+
+        resp.raise_for_status()
+        data = resp.json()
+
+        if "error" in data:
+            logger.warning(f"Google API error: {data['error']}")
+            return []
+
+    except Exception as e:
+        logger.warning(f"Google search failed for '{query}': {e}")
+        return []
+
+    scheduler.report_success()
+    return _google_results(data)
@@ -1,17 +1,32 @@
 import os
 import json
-from typing import List
-from pydantic import BaseModel, Field
+import logging
+import re
+from typing import Any, AsyncIterator, Iterator, List, Optional
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+
+import litellm
 
 # from huggingface_hub import InferenceClient
-from litellm import completion
+from llm import acompletion, completion
 from prompts import TASK_SPLITTER_SYSTEM_INSTRUCTIONS
 
 LLM_SUBTASKS_MODEL = os.environ["LLM_SUBTASKS_MODEL"]
 LLM_SUBTASKS_BASE_URL = os.environ["LLM_SUBTASKS_BASE_URL"]
 LLM_SUBTASKS_API_KEY = os.environ["LLM_SUBTASKS_API_KEY"]
 
+# "auto": enforce TASK_SPLITTER_JSON_SCHEMA where litellm knows the model supports it,
+# "json_schema": always send it, "off": never send it
+SPLITTER_RESPONSE_FORMAT = os.environ.get("SPLITTER_RESPONSE_FORMAT", "auto")
+# Extra calls (with the validation error) when the output can't be repaired locally
+SPLITTER_MAX_RETRIES = int(os.environ.get("SPLITTER_MAX_RETRIES", 1))
+
+logger = logging.getLogger(__name__)
+
 class Subtask(BaseModel):
+    # Strict JSON schema (no additional properties) for structured outputs
+    model_config = ConfigDict(extra="forbid")
+
     id: str = Field(
         ...,
         description="Short identifier for the subtask (e.g. 'A', 'history', 'drivers').",
@@ -26,6 +41,8 @@ class Subtask(BaseModel):
     )
 
 class SubtaskList(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
     subtasks: List[Subtask] = Field(
         ...,
         description="List of subtasks that together cover the whole research plan.",
@@ -37,28 +54,344 @@ TASK_SPLITTER_JSON_SCHEMA = {
     "strict": True,
 }
 
-def split_into_subtasks(research_plan: str) -> List[Subtask]:
+def split_into_subtasks(research_plan: str) -> List[dict]:
     print("Splitting the research plan into subtasks...")
     print("MODEL: ", LLM_SUBTASKS_MODEL)
     print("API_BASE: ", LLM_SUBTASKS_BASE_URL)
 
-    from typing import Any
+    return _split_with_retries(_splitter_messages(research_plan), research_plan)
+
+
+def stream_subtasks(research_plan: str) -> Iterator[dict]:
+    """
+    Like split_into_subtasks, but streams the splitter output and yields
+    every subtask as soon as its JSON object is complete, in output order.
+
+    If the stream yields no valid subtask, the collected output goes through
+    the same repair/retry path as without streaming. If it fails midway, the
+    model is shown the subtasks yielded so far and asked for the rest.
+    """
+    print("Splitting the research plan into subtasks (streaming)...")
+    print("MODEL: ", LLM_SUBTASKS_MODEL)
+    print("API_BASE: ", LLM_SUBTASKS_BASE_URL)
+
+    messages = _splitter_messages(research_plan)
+    parser = SubtaskStreamParser()
+    yielded = []
+    try:
+        for chunk in _request_subtasks(messages, stream=True):
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            for subtask in parser.feed(delta or ""):
+                yielded.append(subtask)
+                yield subtask
+    except Exception as e:
+        logger.warning(f"Streaming the subtasks failed after {len(yielded)} subtasks: {e}")
+        if yielded:
+            # The stream broke off mid-list: ask for the rest only
+            yield from _recover_rest(messages, yielded)
+            return
+
+    if yielded:
+        return
+
+    # Nothing usable came through the stream
+    yield from _split_with_retries(messages, research_plan, content=parser.text or None)
+
+
+def _recover_rest(messages: list[dict], yielded: List[dict]) -> List[dict]:
+    messages = _continuation_messages(messages, yielded)
+    for attempt in range(SPLITTER_MAX_RETRIES + 1):
+        try:
+            content = _request_subtasks(messages).choices[0].message.content
+            return _not_yet_yielded(parse_subtasks(content, allow_empty=True), yielded)
+        except Exception as e:
+            logger.warning(f"Recovering the remaining subtasks failed (attempt {attempt + 1}): {e}")
+    # Better a partial list than running the yielded subtasks twice
+    return []
+
+
+def _continuation_messages(messages: list[dict], yielded: List[dict]) -> list[dict]:
+    return messages[:2] + [
+        {"role": "assistant", "content": json.dumps({"subtasks": yielded}, ensure_ascii=False)},
+        {"role": "user", "content": (
+            "Your output was cut off after these subtasks, which are already being researched. "
+            "Return only the remaining subtasks of the plan, without repeating any of the above "
+            "or reusing their ids, as a single valid JSON object following the required schema, "
+            'and nothing else. If the subtasks above already cover the whole plan, return {"subtasks": []}.'
+        )},
+    ]
+
+
+def _not_yet_yielded(subtasks: List[dict], yielded: List[dict]) -> List[dict]:
+    """Drop subtasks the model repeated (same title or description), rename reused ids."""
+    seen_ids = {subtask["id"] for subtask in yielded}
+    seen_texts = {_normalize(subtask[field]) for subtask in yielded for field in ("title", "description")}
+
+    remaining = []
+    for subtask in subtasks:
+        texts = {_normalize(subtask["title"]), _normalize(subtask["description"])}
+        if texts & seen_texts:
+            continue
+        subtask_id, n = subtask["id"], 2
+        while subtask_id in seen_ids:
+            subtask_id, n = f"{subtask['id']}_{n}", n + 1
+        seen_ids.add(subtask_id)
+        seen_texts |= texts
+        remaining.append({**subtask, "id": subtask_id})
+
+    print(f"  → Recovered {len(remaining)} more subtasks after the stream failed")
+    return remaining
+
+
+def _normalize(text: str) -> str:
+    return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+
+def _splitter_messages(research_plan: str) -> list[dict]:
+    return [
+        {"role": "system", "content": TASK_SPLITTER_SYSTEM_INSTRUCTIONS},
+        {"role": "user", "content": research_plan},
+    ]
+
+
+def _split_with_retries(messages: list[dict], research_plan: str, content: Optional[str] = None) -> List[dict]:
+    for attempt in range(SPLITTER_MAX_RETRIES + 1):
+        if content is None:
+            content = _request_subtasks(messages).choices[0].message.content
+        try:
+            return parse_subtasks(content)
+        except ValueError as e:
+            logger.warning(f"Subtask output invalid (attempt {attempt + 1}): {e}")
+            messages = _retry_messages(messages, content, e)
+            content = None
+
+    return _whole_plan_subtask(research_plan)
+
+
+def _retry_messages(messages: list[dict], content: Optional[str], error: ValueError) -> list[dict]:
+    # Targeted retry: show the model its output and what was wrong with it
+    return messages[:2] + [
+        {"role": "assistant", "content": content or ""},
+        {"role": "user", "content": (
+            f"Your output could not be used: {error}\n"
+            "Return the complete subtask list again as a single valid JSON object "
+            "following the required schema, and nothing else."
+        )},
+    ]
+
+
+def _whole_plan_subtask(research_plan: str) -> List[dict]:
+    # Research the plan as a whole rather than failing the run
+    logger.warning("No valid subtasks from the splitter, using the whole plan as one subtask")
+    return [{"id": "main", "title": "Research plan", "description": research_plan}]
+
+
+def _request_subtasks(messages: list[dict], stream: bool = False) -> Any:
+    return completion("splitter", **_request_kwargs(messages, stream))
 
-    response: Any = completion(
+
+def _request_kwargs(messages: list[dict], stream: bool) -> dict:
+    response_format = None
+    if _use_response_schema():
+        response_format = {"type": "json_schema", "json_schema": TASK_SPLITTER_JSON_SCHEMA}
+
+    kwargs = dict(
         model=LLM_SUBTASKS_MODEL,
         api_base=LLM_SUBTASKS_BASE_URL,
         api_key=LLM_SUBTASKS_API_KEY,
-        messages=[
-            {"role": "system", "content": TASK_SPLITTER_SYSTEM_INSTRUCTIONS},
-            {"role": "user", "content": research_plan},
-        ],
-        stream=False,
+        messages=messages,
+        response_format=response_format,
+        stream=stream,
     )
+    if stream:
+        # Usage of a streamed call only comes with its last chunk
+        kwargs["stream_options"] = {"include_usage": True}
+    return kwargs
+
+
+# ******************************
+# Async variants (async engine)
+# ******************************
+async def asplit_into_subtasks(research_plan: str) -> List[dict]:
+    """Async counterpart of split_into_subtasks."""
+    return await _asplit_with_retries(_splitter_messages(research_plan), research_plan)
+
+
+async def astream_subtasks(research_plan: str) -> AsyncIterator[dict]:
+    """Async counterpart of stream_subtasks."""
+    print("Splitting the research plan into subtasks (streaming)...")
+
+    messages = _splitter_messages(research_plan)
+    parser = SubtaskStreamParser()
+    yielded = []
+    try:
+        async for chunk in await acompletion("splitter", **_request_kwargs(messages, stream=True)):
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            for subtask in parser.feed(delta or ""):
+                yielded.append(subtask)
+                yield subtask
+    except Exception as e:
+        logger.warning(f"Streaming the subtasks failed after {len(yielded)} subtasks: {e}")
+        if yielded:
+            for subtask in await _arecover_rest(messages, yielded):
+                yield subtask
+            return
+
+    if yielded:
+        return
+
+    for subtask in await _asplit_with_retries(messages, research_plan, content=parser.text or None):
+        yield subtask
+
+
+async def _asplit_with_retries(messages: list[dict], research_plan: str, content: Optional[str] = None) -> List[dict]:
+    for attempt in range(SPLITTER_MAX_RETRIES + 1):
+        if content is None:
+            response = await acompletion("splitter", **_request_kwargs(messages, stream=False))
+            content = response.choices[0].message.content
+        try:
+            return parse_subtasks(content)
+        except ValueError as e:
+            logger.warning(f"Subtask output invalid (attempt {attempt + 1}): {e}")
+            messages = _retry_messages(messages, content, e)
+            content = None
+
+    return _whole_plan_subtask(research_plan)
+
+
+async def _arecover_rest(messages: list[dict], yielded: List[dict]) -> List[dict]:
+    messages = _continuation_messages(messages, yielded)
+    for attempt in range(SPLITTER_MAX_RETRIES + 1):
+        try:
+            response = await acompletion("splitter", **_request_kwargs(messages, stream=False))
+            content = response.choices[0].message.content
+            return _not_yet_yielded(parse_subtasks(content, allow_empty=True), yielded)
+        except Exception as e:
+            logger.warning(f"Recovering the remaining subtasks failed (attempt {attempt + 1}): {e}")
+    return []
+
+
+def _use_response_schema() -> bool:
+    if SPLITTER_RESPONSE_FORMAT == "auto":
+        try:
+            return litellm.supports_response_schema(model=LLM_SUBTASKS_MODEL)
+        except Exception:
+            return False
+    return SPLITTER_RESPONSE_FORMAT == "json_schema"
+
+
+TRAILING_COMMA_PATTERN = re.compile(r",\s*([}\]])")
+
+
+def _load_json(text: str):
+    """json.loads, retried without trailing commas only if the text doesn't parse as is."""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        # The regex doesn't know about strings, so it must not touch valid JSON
+        return json.loads(TRAILING_COMMA_PATTERN.sub(r"\1", text))
+
+
+def parse_subtasks(content: Optional[str], allow_empty: bool = False) -> List[dict]:
+    """
+    Parse and validate the splitter output, repairing common glitches locally
+    (code fences, prose around the JSON, trailing commas, a bare list).
+
+    Raises ValueError if no valid subtask list can be recovered, or if it is
+    empty and `allow_empty` isn't set.
+    """
+    if not content or not content.strip():
+        raise ValueError("empty output")
+
+    text = content.strip()
+    # Strip markdown code fences
+    text = re.sub(r"^```(?:json)?\s*|\s*```$", "", text).strip()
+    # Cut prose before/after the JSON value
+    starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+    if starts:
+        start = min(starts)
+        end = max(text.rfind("}"), text.rfind("]"))
+        text = text[start:end + 1]
+    try:
+        data = _load_json(text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"invalid JSON ({e})")
+
+    if isinstance(data, list):
+        data = {"subtasks": data}
+    # Drop keys the schema doesn't know instead of rejecting the whole output
+    if isinstance(data, dict) and isinstance(data.get("subtasks"), list):
+        data = {"subtasks": [
+            {k: v for k, v in item.items() if k in Subtask.model_fields} if isinstance(item, dict) else item
+            for item in data["subtasks"]
+        ]}
+
+    try:
+        subtask_list = SubtaskList.model_validate(data)
+    except ValidationError as e:
+        first = e.errors()[0]
+        location = ".".join(str(part) for part in first["loc"]) or "root"
+        raise ValueError(f"does not match the schema ({e.error_count()} errors, first at {location}: {first['msg']})")
+
+    if not subtask_list.subtasks and not allow_empty:
+        raise ValueError("no subtasks")
+
+    return [subtask.model_dump() for subtask in subtask_list.subtasks]
+
+class SubtaskStreamParser:
+    """
+    Incremental scanner for the splitter output.
+
+    `feed()` takes the next piece of text and returns the subtasks whose
+    JSON object was completed by it. Every object directly inside an array
+    is a candidate; it is validated as a Subtask and skipped if invalid.
+    """
+    def __init__(self):
+        self.text = ""
+        self._position = 0
+        # Open containers: (bracket, position in text)
+        self._stack: list[tuple[str, int]] = []
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, piece: str) -> List[dict]:
+        self.text += piece
+        subtasks = []
+        while self._position < len(self.text):
+            char = self.text[self._position]
+            self._position += 1
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"' and self._stack:
+                self._in_string = True
+            elif char in "{[":
+                self._stack.append((char, self._position - 1))
+            elif char in "}]" and self._stack:
+                _, start = self._stack.pop()
+                if char == "}" and self._stack and self._stack[-1][0] == "[":
+                    subtask = self._validate(self.text[start:self._position])
+                    if subtask is not None:
+                        subtasks.append(subtask)
+        return subtasks
 
-    content = response.choices[0].message.content
-    subtasks = json.loads(content)["subtasks"]
+    @staticmethod
+    def _validate(text: str) -> Optional[dict]:
+        try:
+            item = _load_json(text)
+            item = {k: v for k, v in item.items() if k in Subtask.model_fields}
+            return Subtask.model_validate(item).model_dump()
+        except (json.JSONDecodeError, ValidationError) as e:
+            logger.warning(f"Skipping invalid subtask in stream: {e}")
+            return None
 
-    return subtasks
 
 if __name__ == "__main__":
     with open("example-results/1_research_plan.md") as f:
@@ -0,0 +1,111 @@
+"""
+_select_main_content must pick the same node as the original selector,
+which scored every div with its own find_all/get_text calls.
+"""
+import importlib.util
+import os
+import sys
+from pathlib import Path
+
+import pytest
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("FETCH_CACHE_ENABLED", "0")
+
+from scraper import _best_text_dense_div, _select_main_content  # noqa: E402
+
+FIXTURES = sorted((Path(__file__).parent / "fixtures" / "main_content").glob("*.html"))
+PARSERS = ["html.parser"] + (["lxml"] if importlib.util.find_spec("lxml") else [])
+
+# Removed by _process_html before the main content is selected
+BOILERPLATE_TAGS = ["script", "style", "nav", "footer", "header", "aside", "noscript"]
+
+
+def _reference_text_dense_div(soup: BeautifulSoup):
+    """Text-dense fallback as it was before the single-pass scorer."""
+    best_candidate = None
+    best_score = 0
+
+    for tag in soup.find_all("div"):
+        if tag.find(["nav", "aside", "footer", "header"]):
+            continue
+
+        paragraphs = len(tag.find_all("p"))
+        headings = len(tag.find_all(["h1", "h2", "h3", "h4", "h5", "h6"]))
+        list_items = len(tag.find_all("li"))
+        links = len(tag.find_all("a"))
+
+        text_length = len(tag.get_text(strip=True))
+        if text_length < 200:
+            continue
+
+        score = paragraphs * 3 + headings * 5 + list_items - links * 2
+        if score > best_score:
+            best_score = score
+            best_candidate = tag
+
+    return best_candidate
+
+
+def _reference_select_main_content(soup: BeautifulSoup):
+    """_select_main_content as it was before the single-pass scorer."""
+    for candidate in (
+        soup.find("main"),
+        soup.find("article"),
+        soup.find(attrs={"role": "main"}),
+        soup.find(attrs={"itemprop": "articleBody"}),
+    ):
+        if candidate:
+            return candidate
+
+    content_keys = [
+        "content", "post-content", "entry-content", "article-content",
+        "markdown-body", "prose", "story-body",
+    ]
+
+    def has_content_hint(tag):
+        if tag.name != "div":
+            return False
+        classes = " ".join(tag.get("class", [])).lower()
+        tag_id = (tag.get("id") or "").lower()
+        return any(key in classes or key in tag_id for key in content_keys)
+
+    hinted = soup.find(has_content_hint)
+    if hinted:
+        return hinted
+
+    return _reference_text_dense_div(soup) or soup.body
+
+
+def _soup(path: Path, parser: str, strip_boilerplate: bool) -> BeautifulSoup:
+    soup = BeautifulSoup(path.read_text(encoding="utf-8"), parser)
+    if strip_boilerplate:
+        for tag in soup(BOILERPLATE_TAGS):
+            tag.decompose()
+    return soup
+
+
+@pytest.mark.parametrize("strip_boilerplate", [False, True])
+@pytest.mark.parametrize("parser", PARSERS)
+@pytest.mark.parametrize("fixture", FIXTURES, ids=lambda path: path.stem)
+def test_text_dense_div_matches_reference(fixture, parser, strip_boilerplate):
+    soup = _soup(fixture, parser, strip_boilerplate)
+    assert _best_text_dense_div(soup) is _reference_text_dense_div(soup)
+
+
+@pytest.mark.parametrize("strip_boilerplate", [False, True])
+@pytest.mark.parametrize("parser", PARSERS)
+@pytest.mark.parametrize("fixture", FIXTURES, ids=lambda path: path.stem)
+def test_select_main_content_matches_reference(fixture, parser, strip_boilerplate):
+    soup = _soup(fixture, parser, strip_boilerplate)
+    assert _select_main_content(soup) is _reference_select_main_content(soup)
+
+
+def test_fixtures_reach_the_scorer():
+    """Most fixtures must be decided by the text-dense scorer, not by earlier steps."""
+    decided_by_scorer = [
+        fixture for fixture in FIXTURES
+        if _reference_text_dense_div(_soup(fixture, "html.parser", True)) is not None
+    ]
+    assert len(decided_by_scorer) >= 5
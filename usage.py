@@ -0,0 +1,104 @@
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+import litellm
+
+logger = logging.getLogger(__name__)
+
+# Ledger of the current run and the subtask an LLM call belongs to.
+# Set by the coordinators; calls outside a run are not recorded.
+current_ledger: ContextVar[Optional["UsageLedger"]] = ContextVar("current_ledger", default=None)
+current_usage_subtask: ContextVar[Optional[str]] = ContextVar("current_usage_subtask", default=None)
+
+TOTAL_FIELDS = ("calls", "prompt_tokens", "completion_tokens", "cached_tokens", "latency", "cost")
+
+# Models litellm has no prices for (asked once per process)
+_unpriced_models: set[str] = set()
+
+
+class UsageLedger:
+    """Tokens, latency and estimated cost of every LLM call of one run."""
+    def __init__(self):
+        self.started = time.time()
+        self.calls: list[dict] = []
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, model: str, usage, latency: float):
+        """Add one completed call; `usage` is the usage object of its response."""
+        details = getattr(usage, "prompt_tokens_details", None)
+        call = {
+            "phase": stage,
+            "subtask": current_usage_subtask.get(),
+            "model": model,
+            "prompt_tokens": getattr(usage, "prompt_tokens", None) or 0,
+            "completion_tokens": getattr(usage, "completion_tokens", None) or 0,
+            "cached_tokens": (
+                getattr(details, "cached_tokens", None)
+                or getattr(usage, "cache_read_input_tokens", None)
+                or 0
+            ),
+            "latency": round(latency, 3),
+            "cost": estimate_cost(model, usage),
+        }
+        with self._lock:
+            self.calls.append(call)
+
+    def totals(self, phase: Optional[str] = None, subtask: Optional[str] = None) -> dict:
+        """Sum over the calls, optionally of one phase and/or subtask."""
+        with self._lock:
+            calls = [
+                c for c in self.calls
+                if (phase is None or c["phase"] == phase) and (subtask is None or c["subtask"] == subtask)
+            ]
+        return _sum_calls(calls)
+
+    def summary(self) -> dict:
+        """Machine-readable summary: totals, per phase, per subtask and every call."""
+        with self._lock:
+            calls = list(self.calls)
+        phases = sorted({c["phase"] for c in calls})
+        subtasks = sorted({c["subtask"] for c in calls if c["subtask"] is not None})
+        return {
+            "started": self.started,
+            "duration": round(time.time() - self.started, 3),
+            "total": _sum_calls(calls),
+            "phases": {p: _sum_calls([c for c in calls if c["phase"] == p]) for p in phases},
+            "subtasks": {s: _sum_calls([c for c in calls if c["subtask"] == s]) for s in subtasks},
+            # Prices unknown to litellm count as 0 in the cost totals
+            "unpriced_models": sorted({c["model"] for c in calls if c["cost"] is None}),
+            "calls": calls,
+        }
+
+
+def _sum_calls(calls: list[dict]) -> dict:
+    totals = {"calls": len(calls)}
+    totals.update({field: sum(c[field] or 0 for c in calls) for field in TOTAL_FIELDS if field != "calls"})
+    totals["latency"] = round(totals["latency"], 3)
+    totals["cost"] = round(totals["cost"], 6)
+    return totals
+
+
+def estimate_cost(model: str, usage) -> Optional[float]:
+    """Cost in USD from litellm's price list, None if the model isn't in it."""
+    if usage is None or model in _unpriced_models:
+        return None
+    try:
+        prompt_cost, completion_cost = litellm.cost_per_token(model=model, usage_object=usage)
+        return prompt_cost + completion_cost
+    except Exception:
+        _unpriced_models.add(model)
+        return None
+
+
+def record_call(stage: str, model: str, usage, latency: float):
+    """Record an LLM call in the current run's ledger (no-op outside a run)."""
+    ledger = current_ledger.get()
+    if ledger is None or usage is None:
+        return
+    try:
+        ledger.record(stage, model, usage, latency)
+    except Exception as e:
+        logger.warning(f"Could not record LLM usage: {e}")